@@ -0,0 +1,128 @@
+"""
+Benchmark: content classification inline vs in the process pool.
+
+Runs PurgePipeline over a synthetic in-memory history (pages of 100 with a
+simulated fetch latency) with a heavy `.purge` expression, once with the
+pool disabled and once with it enabled. Reports scan throughput and
+event-loop lag (how late a 10ms sleep wakes up), which is what gateway
+heartbeats and watch-mode see while a purge runs.
+
+Usage: python benchmarks/bench_classify.py [--messages N] [--rules N] [--length CHARS]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from discord.utils import snowflake_time  # noqa: E402
+
+from bench_purger import LagProbe  # noqa: E402
+
+
+class Snowflake:
+    def __init__(self, object_id):
+        self.id = object_id
+
+
+class FakeMessage:
+    def __init__(self, message_id, content, author, channel):
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.attachments = []
+        self.pinned = False
+
+    @property
+    def created_at(self):
+        return snowflake_time(self.id)
+
+    async def delete(self):
+        pass
+
+
+def make_history(count, length, rng):
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2000)]
+    author = Snowflake(1)
+    channel = Snowflake(2)
+    messages = []
+    for index in range(count):
+        content = ""
+        while len(content) < length:
+            content += rng.choice(words) + " "
+        messages.append(FakeMessage(10**17 + count - index, content, author, channel))
+    return messages
+
+
+async def history(messages, page_latency):
+    for index, message in enumerate(messages):
+        if index % 100 == 0:
+            await asyncio.sleep(page_latency)
+        yield message
+
+
+async def run(pb, messages, expression, page_latency):
+    compiled = pb.compile_expression(expression)
+    # Every message is ours, so matches go through the single-delete scheduler (no bulk request)
+    pipeline = pb.PurgePipeline(history(messages, page_latency), compiled.predicate, can_manage=False, verbose=False)
+    started = time.perf_counter()
+    with LagProbe() as probe:
+        scanned, deleted = await pipeline.run()
+    elapsed = time.perf_counter() - started
+    classifier = pipeline.classifier
+    return {
+        "scanned": scanned,
+        "matched": pipeline.matched,
+        "elapsed_s": round(elapsed, 3),
+        "scan_msgs_per_s": round(scanned / elapsed, 1),
+        "offloaded": classifier.offloaded if classifier else 0,
+        "loop_lag": probe.summary(),
+    }
+
+
+async def main(args):
+    os.chdir(tempfile.mkdtemp(prefix="purger-classify-"))
+    import purger_bot as pb
+    pb.console.file = open(os.devnull, "w")
+    pb.bot._connection.user = type("Me", (), {"id": 1})()
+
+    rng = random.Random(args.seed)
+    messages = make_history(args.messages, args.length, rng)
+    patterns = [f"re:\"\\\\b{''.join(rng.choices(string.ascii_lowercase, k=3))}[a-z]*(ing|ed|er)\\\\b\"" for _ in range(args.rules)]
+    expression = " OR ".join(patterns)
+
+    results = {"config": vars(args)}
+    workers = pb.CLASSIFY_WORKERS
+    for mode in ("inline", "pool"):
+        pb.CLASSIFY_WORKERS = 0 if mode == "inline" else workers
+        if mode == "pool":
+            await run(pb, messages[:200], expression, 0) # Warm up the workers
+        results[mode] = await run(pb, messages, expression, args.page_latency)
+    if pb.classify_pool:
+        pb.classify_pool.shutdown()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(os.path.join(ROOT, args.out) if not os.path.isabs(args.out) else args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rules", type=int, default=30, help="regex rules OR-ed together")
+    parser.add_argument("--length", type=int, default=400, help="characters per message")
+    parser.add_argument("--page-latency", type=float, default=0.02, help="simulated history fetch per page (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    asyncio.run(main(parser.parse_args()))
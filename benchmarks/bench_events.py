@@ -0,0 +1,170 @@
+"""
+Gateway throughput benchmark for watch mode: MESSAGE_CREATE events/sec and CPU per 1k events.
+
+The account from bench_startup's synthetic READY (moderator in half of the
+guilds) receives a stream of zlib-stream compressed MESSAGE_CREATE frames
+from other users in every channel. Frames go through discord.py's real
+DiscordWebSocket.received_message (decompress, JSON decode, parse, dispatch)
+into purger_bot's on_message, with one yield to the loop per frame as a
+socket read would. Auto-delete submissions are only recorded, so the
+numbers are the receive path alone (bench_purger's watch scenario covers
+the deletes).
+
+Each configuration runs in a fresh process. A "+stdlib" suffix forces
+stdlib json decoding, i.e. the default runtime without orjson installed.
+
+Usage:
+  python benchmarks/bench_events.py --events 50000 --watch word --out events.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import GUILD_BASE, USER_BASE, GatewayStandIn, guild_payload, ready_payloads, user_payload  # noqa: E402
+
+WORDS = "the a to of and in is it you that was for on are with as have be at one this chat lol ok nice".split()
+
+
+def message_frame(seq, message_id, channel_id, author_id, content):
+    return {
+        "op": 0, "s": seq, "t": "MESSAGE_CREATE",
+        "d": {
+            "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(channel_id - (channel_id - GUILD_BASE) % 1000),
+            "author": user_payload(author_id), "member": {"roles": [], "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False, "mute": False},
+            "content": content, "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+            "pinned": False, "type": 0, "flags": 0, "components": [],
+        },
+    }
+
+
+def build_frames(args, channel_ids):
+    """zlib-stream frames as the gateway sends them: one compressor, a sync flush after each payload."""
+    rng = random.Random(args.seed)
+    compressor = zlib.compressobj()
+    frames = []
+    for n in range(args.events):
+        words = rng.choices(WORDS, k=rng.randint(3, 15))
+        if rng.random() < args.target_ratio:
+            words.insert(rng.randrange(len(words) + 1), "spam")
+        payload = message_frame(n + 1, GUILD_BASE * 2 + n, rng.choice(channel_ids), USER_BASE + rng.randrange(1, 5000), " ".join(words))
+        frames.append(compressor.compress(json.dumps(payload).encode()) + compressor.flush(zlib.Z_SYNC_FLUSH))
+    return frames
+
+
+def manageable(channel_id):
+    return ((channel_id - GUILD_BASE) // 1000) % 2 == 0  # guild_payload gives us the mod role in even guilds
+
+
+async def child(args, pb):
+    import discord
+    from discord.gateway import DiscordWebSocket
+
+    bot = pb.bot
+    state = bot._connection
+    bot.ws = GatewayStandIn(state, 0, 1000, 0.0)
+    await bot._async_setup_hook()
+    guilds = [guild_payload(i, args.channels, 0) for i in range(args.guilds)]
+    ready, supplemental = ready_payloads(guilds)
+    state.parsers["READY"](ready)
+    state.parsers["READY_SUPPLEMENTAL"](supplemental)
+    await asyncio.wait_for(bot.wait_until_ready(), timeout=60)
+    await asyncio.sleep(0.6)  # Let on_ready and the debounced guild subscriptions settle
+
+    if args.watch == "everyone":
+        pb.target_user_id = "everyone"
+    else:
+        pb.watched_words[:] = ["spam"]
+        pb.watch_matcher.rebuild(pb.watched_words)
+    detected = []
+    pb.auto_deleter.submit = lambda message, label, prefix: detected.append(message.channel.id)
+
+    ws = DiscordWebSocket(socket=None, loop=asyncio.get_running_loop())
+    ws._discord_parsers = state.parsers
+    ws._dispatch = bot.dispatch
+    channel_ids = [int(c["id"]) for g in guilds for c in g["channels"]]
+    frames = build_frames(args, channel_ids)
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    for frame in frames:
+        await ws.received_message(frame)
+        await asyncio.sleep(0)
+    for _ in range(5):
+        await asyncio.sleep(0)  # Let the last on_message tasks finish
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+    return {
+        "runtime": pb.runtime_description,
+        "loop": type(asyncio.get_running_loop()).__module__,
+        "json": "orjson" if discord.utils._from_json is not json.loads else "stdlib",
+        "events": args.events,
+        "events_per_s": round(args.events / elapsed, 1),
+        "cpu_ms_per_1k_events": round(cpu / args.events * 1e6, 2),
+        "detected": len(detected),
+        "detected_deletable": sum(1 for channel_id in detected if manageable(channel_id)),
+        "dropped_early": pb.message_filter.dropped,
+    }
+
+
+def run_child(args):
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="purger-events-"))
+    import purger_bot as pb
+    pb.console.file = open(os.devnull, "w")
+    if args.stdlib_json:
+        import discord.utils
+        discord.utils._from_json = json.loads
+    pb.install_runtime()
+    print(json.dumps(asyncio.run(child(args, pb))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="default+stdlib,default,fast", help="comma-separated PURGER_RUNTIME values (+stdlib = stdlib json)")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--channels", type=int, default=20, help="text channels per guild")
+    parser.add_argument("--watch", choices=("word", "everyone"), default="word", help=".watch_word spam or .watch_user everyone")
+    parser.add_argument("--target-ratio", type=float, default=0.01, help="share of events containing the watched word")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--stdlib-json", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "child", "stdlib_json", "profiles")}
+    results = {"config": {**config, "profiles": args.profiles}}
+    for profile in args.profiles.split(","):
+        runtime, _, variant = profile.partition("+")
+        command = [sys.executable, os.path.abspath(__file__), "--child"] + [f"--{key.replace('_', '-')}={value}" for key, value in config.items()]
+        if variant == "stdlib":
+            command.append("--stdlib-json")
+        proc = subprocess.run(command, env={**os.environ, "PURGER_RUNTIME": runtime}, capture_output=True, text=True)
+        if proc.returncode:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"profile {profile} failed")
+        results[profile] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(os.path.join(ROOT, args.out) if not os.path.isabs(args.out) else args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+End-to-end benchmark: runs purger_bot.py against the local mock Discord server.
+
+Scenarios:
+  scan_delete  smart_purge over one synthetic channel (scan + delete throughput)
+  multipurge   MultiChannelPurge over several channels sharing the delete budget
+  watch        on_message watchers fed by the gateway stand-in (reaction latency)
+
+Every scenario also reports event-loop lag (how late a 10ms sleep wakes up).
+
+Usage:
+  python benchmarks/bench_purger.py --messages 100000 --scenario scan_delete --out bench.json
+
+Results are printed (and optionally written) as JSON so runs can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import discord  # noqa: E402
+import discord.http  # noqa: E402
+import discord.utils  # noqa: E402
+
+from mock_discord import BucketConfig, GatewayStandIn, MockDiscord, SyntheticChannel  # noqa: E402
+
+
+def point_client_at(base_url):
+    """Sends discord.py's REST traffic to the mock and skips its online header discovery."""
+    discord.http.Route.BASE = base_url
+
+    async def offline_headers(cls, *args, **kwargs):
+        properties = {
+            "os": "Windows",
+            "browser": "Chrome",
+            "browser_user_agent": cls._get_user_agent(cls.FALLBACK_BROWSER_VERSION),
+            "browser_version": f"{cls.FALLBACK_BROWSER_VERSION}.0.0.0",
+            "client_build_number": cls.FALLBACK_BUILD_NUMBER,
+        }
+        return cls(platform="Windows", major_version=cls.FALLBACK_BROWSER_VERSION, super_properties=properties, encoded_super_properties="e30=")
+
+    discord.utils.Headers.default = classmethod(offline_headers)
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(int(q * len(values)), len(values) - 1)]  # noqa: E731
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+    }
+
+
+class LagProbe:
+    """Samples event-loop lag: how late a short sleep wakes up while a scenario runs."""
+
+    INTERVAL = 0.01
+
+    def __init__(self):
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.INTERVAL)
+            self.samples.append(max(0.0, loop.time() - start - self.INTERVAL))
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self):
+        return percentiles(self.samples)
+
+
+class ManagedChannel:
+    """Wraps a PartialMessageable so permission checks report Manage Messages."""
+
+    def __init__(self, channel):
+        self._channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    def permissions_for(self, obj):
+        return discord.Permissions(manage_messages=True)
+
+
+class BenchContext:
+    """Just enough of a commands.Context for smart_purge."""
+
+    def __init__(self, bot, channel, manage=False):
+        self.bot = bot
+        self.channel = ManagedChannel(channel) if manage else channel
+        self.author = bot.user
+
+
+async def scenario_scan_delete(pb, mock, channel_id, args):
+    channel = pb.bot.get_partial_messageable(channel_id)
+    before = mock.summary()
+    started = time.perf_counter()
+    scanned, deleted = await pb.smart_purge(
+        BenchContext(pb.bot, channel, manage=args.manage),
+        channel.history(limit=None),
+        filter_func=pb.build_filter({"kind": "all" if args.manage else "own"}),
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "messages": mock.channels[channel_id].size,
+        "scanned": scanned,
+        "deleted": deleted,
+        "elapsed_s": round(elapsed, 3),
+        "scan_msgs_per_s": round(scanned / elapsed, 1),
+        "deletes_per_s": round(deleted / elapsed, 3),
+        "server": diff_summary(before, mock.summary()),
+    }
+
+
+async def scenario_multipurge(pb, mock, channel_ids, args):
+    targets = [pb.ChannelTarget(pb.bot.get_partial_messageable(cid), None, {"kind": "own"}) for cid in channel_ids]
+    before = mock.summary()
+    started = time.perf_counter()
+    deleted = await pb.MultiChannelPurge(targets, concurrency=args.concurrency).run()
+    elapsed = time.perf_counter() - started
+    scanned = sum(t.pipeline.scanned for t in targets if t.pipeline)
+    return {
+        "channels": len(channel_ids),
+        "scanned": scanned,
+        "deleted": deleted,
+        "elapsed_s": round(elapsed, 3),
+        "scan_msgs_per_s": round(scanned / elapsed, 1),
+        "deletes_per_s": round(deleted / elapsed, 3),
+        "server": diff_summary(before, mock.summary()),
+    }
+
+
+async def scenario_watch(pb, mock, channel_ids, args):
+    if args.manage:
+        pb.can_manage_messages = lambda channel: True  # Gateway stand-in channels carry no guild permissions
+    pb.watched_words[:] = ["spam"]
+    pb.watch_matcher.rebuild(pb.watched_words)
+    parsers = pb.bot._connection.parsers
+    gateway = GatewayStandIn(channel_ids, rate=args.event_rate, duration=args.duration, target_ratio=args.target_ratio)
+
+    def on_frame(frame):
+        event = discord.utils._from_json(frame)
+        parsers[event["t"]](event["d"])
+
+    before = mock.summary()
+    queue_before = (pb.auto_deleter.queued, pb.auto_deleter.dropped)
+    started = time.perf_counter()
+    sent = await gateway.run(on_frame)
+    emit_elapsed = time.perf_counter() - started
+
+    # Give queued auto-deletes time to land
+    deadline = time.perf_counter() + args.drain_timeout
+    while time.perf_counter() < deadline and not gateway.targets <= mock.delete_times.keys():
+        await asyncio.sleep(0.1)
+
+    latencies = [mock.delete_times[i] - gateway.sent_at[i] for i in gateway.targets if i in mock.delete_times]
+    pb.watched_words.clear()
+    pb.watch_matcher.rebuild(pb.watched_words)
+    return {
+        "events_sent": sent,
+        "events_per_s": round(sent / emit_elapsed, 1),
+        "targets": len(gateway.targets),
+        "auto_deleted": len(latencies),
+        "reaction": percentiles(latencies),
+        "queue": {
+            "queued": pb.auto_deleter.queued - queue_before[0],
+            "dropped": pb.auto_deleter.dropped - queue_before[1],
+            "peak_depth": pb.auto_deleter.peak_depth,
+            "detect_to_delete_ms": pb.auto_deleter.latency_percentiles(),
+        },
+        "server": diff_summary(before, mock.summary()),
+    }
+
+
+def diff_summary(before, after):
+    out = {}
+    for route, numbers in after.items():
+        prev = before.get(route, {"requests": 0, "429": 0})
+        out[route] = {key: numbers[key] - prev[key] for key in numbers}
+    return out
+
+
+async def main(args):
+    channels = [
+        SyntheticChannel(200000000000000000 + i, size=args.messages // (args.channels if i else 1), own_ratio=args.own_ratio)
+        for i in range(args.channels + 1)
+    ]
+    if args.recent:
+        # Histories that end now, so messages fall inside the 14-day bulk-delete window
+        for channel in channels:
+            channel.start_ms = int(time.time() * 1000) - channel.size * channel.STEP_MS
+    buckets = {"DELETE /channels/{id}/messages/{id}": BucketConfig(args.delete_limit, args.delete_window)}
+    mock = MockDiscord(channels, buckets=buckets, latency=args.latency)
+    base_url = await mock.start()
+    point_client_at(base_url)
+
+    # purger_bot writes its log, index and checkpoints to the working directory
+    workdir = tempfile.mkdtemp(prefix="purger-bench-")
+    os.chdir(workdir)
+    import purger_bot as pb
+
+    if args.console:
+        pb.console.file = open(args.console, "w")  # Keep rendering cost, drop the output
+    if args.log_mode:
+        pb.activity_log.mode = args.log_mode
+    speed = pb.SPEED_POLICIES.get(args.speed) or pb.PacingPolicy("custom", float(args.speed), float(args.speed), 1)
+    pb.delete_scheduler.set_policy(speed)
+
+    await pb.bot.login("bench-token")
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "workdir": workdir,
+    }
+    if args.archive:
+        pb.archive.start(files=args.archive_files, compression=args.archive)
+    try:
+        scenarios = (
+            ("scan_delete", scenario_scan_delete, channels[0].channel_id),
+            ("multipurge", scenario_multipurge, [c.channel_id for c in channels[1:]]),
+            ("watch", scenario_watch, [c.channel_id for c in channels[1:]]),
+        )
+        for name, scenario, channel_arg in scenarios:
+            if args.scenario not in ("all", name):
+                continue
+            with LagProbe() as probe:
+                results[name] = await scenario(pb, mock, channel_arg, args)
+            results[name]["loop_lag"] = probe.summary()
+        if args.archive:
+            closing = time.perf_counter()
+            await pb.archive.stop()
+            results["archive"] = {
+                "compression": pb.archive.compression,
+                "written": pb.archive.written,
+                "dropped": pb.archive.dropped,
+                "bytes": os.path.getsize(pb.archive.path),
+                "files_saved": pb.archive.files_saved,
+                "files_failed": pb.archive.files_failed,
+                "files_skipped": pb.archive.files_skipped,
+                "cdn_requests": mock.cdn_requests,
+                "close_s": round(time.perf_counter() - closing, 3),
+            }
+    finally:
+        await pb.bot.http.close()
+        await mock.stop()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(os.path.join(ROOT, args.out) if not os.path.isabs(args.out) else args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=("all", "scan_delete", "multipurge", "watch"), default="all")
+    parser.add_argument("--messages", type=int, default=10000, help="history size (multipurge splits it across channels)")
+    parser.add_argument("--channels", type=int, default=4, help="channels for multipurge/watch")
+    parser.add_argument("--own-ratio", type=float, default=0.01, help="share of messages authored by us")
+    parser.add_argument("--speed", default="insane", help="pacing preset or fixed delay in seconds")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--delete-limit", type=int, default=5, help="delete bucket size per channel")
+    parser.add_argument("--delete-window", type=float, default=1.0, help="delete bucket window (s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="extra server latency per request (s)")
+    parser.add_argument("--event-rate", type=float, default=50.0, help="gateway MESSAGE_CREATE events/sec")
+    parser.add_argument("--duration", type=float, default=10.0, help="gateway emission time (s)")
+    parser.add_argument("--target-ratio", type=float, default=0.1, help="share of events containing a watched word")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--manage", action="store_true", help="act as a moderator (scan_delete purges every message, watch may bulk-delete)")
+    parser.add_argument("--recent", action="store_true", help="histories end now (inside the bulk-delete window)")
+    parser.add_argument("--console", default=os.devnull, help="where the bot's console output goes (default: discarded)")
+    parser.add_argument("--log-mode", choices=("verbose", "summary", "quiet"), help="per-delete output mode")
+    parser.add_argument("--archive", choices=("gzip", "zstd"), help="archive deleted messages (.archive on)")
+    parser.add_argument("--archive-files", action="store_true", help="also download attachments from the mock CDN")
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    asyncio.run(main(parser.parse_args()))
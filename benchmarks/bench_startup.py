@@ -0,0 +1,221 @@
+"""
+Startup benchmark: time-to-ready and memory for each client profile (PURGER_PROFILE).
+
+A synthetic READY / READY_SUPPLEMENTAL for an account in many guilds is fed
+through discord.py's own parsers. A stand-in gateway answers member-chunk
+requests with GUILD_MEMBERS_CHUNK events (with presences) after a per-chunk
+delay, and counts the subscription ops. Each profile runs in a fresh process
+so import time and RSS are not shared.
+
+Usage:
+  python benchmarks/bench_startup.py --guilds 300 --members 2000 --out startup.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SELF_ID = 100000000000000001
+GUILD_BASE = 300000000000000000
+USER_BASE = 400000000000000000
+MOD_PERMISSIONS = (1 << 1) | (1 << 2) | (1 << 13) | (1 << 28)  # kick, ban, manage messages, manage roles
+
+
+def user_payload(user_id):
+    return {"id": str(user_id), "username": f"user{user_id % 100000}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def guild_payload(index, channels, members):
+    guild_id = GUILD_BASE + index * 1000
+    moderator = index % 2 == 0  # Half the guilds give us chunking permissions
+    return {
+        "id": str(guild_id),
+        "name": f"guild {index}",
+        "member_count": members,
+        "large": members > 250,
+        "owner_id": str(USER_BASE),
+        "roles": [
+            {"id": str(guild_id), "name": "@everyone", "permissions": str(1 << 10 | 1 << 11 | 1 << 16), "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False},
+            {"id": str(guild_id + 1), "name": "mod", "permissions": str(MOD_PERMISSIONS if moderator else 0), "position": 1, "color": 0, "hoist": False, "managed": False, "mentionable": False},
+        ],
+        "channels": [
+            {"id": str(guild_id + 10 + c), "type": 0, "name": f"chan-{c}", "position": c, "permission_overwrites": []}
+            for c in range(channels)
+        ],
+        "threads": [],
+        "emojis": [],
+        "stickers": [],
+        "voice_states": [],
+    }
+
+
+def member_payload(user_id, roles=()):
+    return {"user": user_payload(user_id), "roles": list(roles), "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False, "mute": False}
+
+
+def ready_payloads(guilds):
+    """READY and READY_SUPPLEMENTAL for our account in `guilds`."""
+    ready = {
+        "v": 9,
+        "user": {**user_payload(SELF_ID), "email": None, "verified": True, "mfa_enabled": False, "flags": 0},
+        "session_id": "bench",
+        "guilds": guilds,
+        "merged_members": [[{"user_id": str(SELF_ID), "roles": [g["roles"][1]["id"]], "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False, "mute": False}] for g in guilds],
+        "users": [],
+        "relationships": [],
+        "private_channels": [],
+        "read_state": {"entries": [], "version": 0},
+        "user_guild_settings": {"entries": [], "version": 0},
+    }
+    supplemental = {
+        "guilds": [{"id": g["id"], "voice_states": []} for g in guilds],
+        "merged_members": [[] for _ in guilds],
+        "merged_presences": {"guilds": [[] for _ in guilds], "friends": []},
+        "lazy_private_channels": [],
+    }
+    return ready, supplemental
+
+
+class GatewayStandIn:
+    """Enough of DiscordWebSocket for the READY flow: subscriptions and member chunk requests."""
+
+    def __init__(self, state, members, chunk_size, chunk_latency):
+        self.state = state
+        self.members = members
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+        self.session_id = "bench"
+        self.open = True
+        self.ops = {"subscribe": 0, "request_chunks": 0}
+        self.chunks_sent = 0
+
+    async def bulk_guild_subscribe(self, subscriptions):
+        self.ops["subscribe"] += 1
+
+    async def request_chunks(self, guild_ids, query=None, limit=None, presences=True, user_ids=None, nonce=None):
+        self.ops["request_chunks"] += 1
+        asyncio.create_task(self._send_chunks(list(guild_ids), nonce))
+
+    async def _send_chunks(self, guild_ids, nonce):
+        parse = self.state.parsers["GUILD_MEMBERS_CHUNK"]
+        for guild_id in guild_ids:
+            guild_id = int(guild_id)
+            count = -(-self.members // self.chunk_size)
+            for index in range(count):
+                await asyncio.sleep(self.chunk_latency)
+                ids = range(USER_BASE + index * self.chunk_size, USER_BASE + min((index + 1) * self.chunk_size, self.members))
+                parse({
+                    "guild_id": str(guild_id),
+                    "members": [member_payload(i) for i in ids],
+                    "presences": [{"user": {"id": str(i)}, "status": "online", "activities": [], "client_status": {"desktop": "online"}} for i in ids],
+                    "chunk_index": index,
+                    "chunk_count": count,
+                    "nonce": nonce,
+                })
+                self.chunks_sent += 1
+
+
+async def child(args):
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="purger-startup-"))
+    import purger_bot as pb
+    import_s = time.perf_counter() - started
+    rss_import = pb.current_rss_mb()
+
+    bot = pb.bot
+    pb.console.file = open(os.devnull, "w")
+    state = bot._connection
+    gateway = GatewayStandIn(state, args.members, args.chunk_size, args.chunk_latency)
+    bot.ws = gateway
+    await bot._async_setup_hook()
+
+    guilds = [guild_payload(i, args.channels, args.members) for i in range(args.guilds)]
+    ready, supplemental = ready_payloads(guilds)
+
+    ready_at = time.perf_counter()
+    state.parsers["READY"](ready)
+    state.parsers["READY_SUPPLEMENTAL"](supplemental)
+    await asyncio.wait_for(bot.wait_until_ready(), timeout=args.timeout)
+    ready_s = time.perf_counter() - ready_at
+    rss_ready = pb.current_rss_mb()
+
+    # Chat traffic after READY: what the message cache costs over time
+    channel_ids = [int(c["id"]) for g in guilds for c in g["channels"]]
+    parse_message = state.parsers["MESSAGE_CREATE"]
+    traffic_at = time.perf_counter()
+    for n in range(args.messages):
+        channel_id = channel_ids[n % len(channel_ids)]
+        parse_message({
+            "id": str(GUILD_BASE * 2 + n), "channel_id": str(channel_id), "guild_id": str(channel_id - channel_id % 1000),
+            "author": user_payload(USER_BASE + n % args.members), "content": "hello there " * 8, "timestamp": "2024-01-01T00:00:00+00:00",
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "pinned": False, "type": 0,
+        })
+        if n % 500 == 0:
+            await asyncio.sleep(0)
+    traffic_s = time.perf_counter() - traffic_at
+    await asyncio.sleep(0.6)  # Guild subscriptions are debounced by 0.5s; the welcome renders off-loop meanwhile
+    rss_traffic = pb.current_rss_mb()
+
+    cached_members = sum(len(g._members) for g in bot.guilds)
+    return {
+        "profile": pb.STARTUP_PROFILE,
+        "import_s": round(import_s, 3),
+        "time_to_ready_s": round(ready_s, 3),
+        "process_to_ready_s": round(import_s + ready_s, 3),
+        "rss_after_import_mb": round(rss_import, 1),
+        "rss_ready_mb": round(rss_ready, 1),
+        "rss_after_traffic_mb": round(rss_traffic, 1),
+        "message_events_per_s": round(args.messages / traffic_s, 1),
+        "cached_members": cached_members,
+        "cached_messages": len(bot.cached_messages),
+        "gateway_ops": gateway.ops,
+        "member_chunks_received": gateway.chunks_sent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="full,lean", help="comma-separated PURGER_PROFILE values to compare")
+    parser.add_argument("--guilds", type=int, default=300)
+    parser.add_argument("--channels", type=int, default=20, help="text channels per guild")
+    parser.add_argument("--members", type=int, default=2000, help="members returned per chunked guild")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-latency", type=float, default=0.02, help="delay before each member chunk (s)")
+    parser.add_argument("--messages", type=int, default=20000, help="MESSAGE_CREATE events after READY")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args))))
+        return
+
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("out", "child")}}
+    for profile in args.profiles.split(","):
+        command = [sys.executable, os.path.abspath(__file__), "--child"] + [
+            f"--{key.replace('_', '-')}={value}" for key, value in results["config"].items() if key != "profiles"
+        ]
+        proc = subprocess.run(command, env={**os.environ, "PURGER_PROFILE": profile}, capture_output=True, text=True)
+        if proc.returncode:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"profile {profile} failed")
+        results[profile] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(os.path.join(ROOT, args.out) if not os.path.isabs(args.out) else args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: compiled WatchMatcher vs the old per-word `in` loop.
+
+Usage: python benchmarks/bench_watch_matcher.py [--messages N]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from purger_bot import WatchMatcher  # noqa: E402
+
+
+def legacy_search(words, content):
+    content_lower = content.lower()
+    for word in words:
+        if word.lower() in content_lower:
+            return word
+    return None
+
+
+def make_words(count, rng):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(count)]
+
+
+def make_messages(count, rng):
+    vocab = ["hello", "there", "gg", "lol", "anyone", "online", "tonight", "check", "this", "out", "https://example.com"]
+    return [" ".join(rng.choices(vocab, k=rng.randint(3, 40))) for _ in range(count)]
+
+
+def timed(func, messages):
+    start = time.perf_counter()
+    hits = 0
+    for content in messages:
+        if func(content):
+            hits += 1
+    return time.perf_counter() - start, hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1337)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = make_messages(args.messages, rng)
+
+    print(f"{'patterns':>8}  {'legacy us/msg':>14}  {'matcher us/msg':>15}  {'speedup':>8}  {'rebuild ms':>10}")
+    for count in (10, 100, 1000):
+        words = make_words(count, rng)
+        # Plant a few real hits so both paths do some matching work
+        for i in range(0, len(messages), 50):
+            messages[i] += " " + rng.choice(words)
+
+        start = time.perf_counter()
+        matcher = WatchMatcher(words)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+
+        legacy_time, legacy_hits = timed(lambda c: legacy_search(words, c), messages)
+        matcher_time, matcher_hits = timed(matcher.search, messages)
+        assert legacy_hits == matcher_hits, (legacy_hits, matcher_hits)
+
+        per_legacy = legacy_time / len(messages) * 1e6
+        per_matcher = matcher_time / len(messages) * 1e6
+        print(f"{count:>8}  {per_legacy:>14.2f}  {per_matcher:>15.2f}  {per_legacy / per_matcher:>7.1f}x  {rebuild_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Local stand-in for the parts of the Discord API that purger_bot.py uses.
+
+REST: an aiohttp server serving /users/@me, channel history, single and bulk
+delete, and channel search over synthetic histories. Every route is guarded
+by a configurable rate-limit bucket that sends the same X-RateLimit-* headers
+and 429 bodies Discord does, and every request is recorded in a timeline.
+
+Gateway: `GatewayStandIn` produces MESSAGE_CREATE frames as JSON text at a
+fixed rate. The harness decodes and dispatches them through discord.py's own
+event parsers, which is the path on_message runs on after the websocket.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+SELF_ID = 100000000000000001
+OTHER_IDS = [100000000000000002 + i for i in range(50)]
+EPOCH_MS = 1420070400000
+ATTACHMENT_BYTES = 64 * 1024  # Body served for every synthetic attachment
+WORDS = ["hello", "there", "gg", "lol", "anyone", "online", "tonight", "check", "this", "out", "spam", "raid"]
+
+
+def snowflake(ms, seq=0):
+    return ((ms - EPOCH_MS) << 22) | (seq & 0x3FFFFF)
+
+
+@dataclass
+class BucketConfig:
+    limit: int
+    window: float
+
+
+DEFAULT_BUCKETS = {
+    "GET /channels/{id}/messages": BucketConfig(limit=50, window=1.0),
+    "DELETE /channels/{id}/messages/{id}": BucketConfig(limit=5, window=1.0),
+    "POST /channels/{id}/messages/bulk-delete": BucketConfig(limit=1, window=1.0),
+    "GET /channels/{id}/messages/search": BucketConfig(limit=10, window=5.0),
+}
+
+
+class Bucket:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.remaining = config.limit
+        self.reset_at = 0.0
+
+    def take(self, now):
+        if now >= self.reset_at:
+            self.remaining = self.config.limit
+            self.reset_at = now + self.config.window
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    def headers(self, now):
+        reset_after = max(self.reset_at - now, 0.0)
+        return {
+            "X-RateLimit-Limit": str(self.config.limit),
+            "X-RateLimit-Remaining": str(max(self.remaining, 0)),
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": self.name.replace(" ", "_"),
+            "Via": "1.1 google",  # discord.py treats 429s without Via as Cloudflare bans
+        }
+
+
+@dataclass
+class SyntheticChannel:
+    """
+    A history of `size` messages one minute apart, generated on demand from
+    the message index so even 1M-message channels cost no memory up front.
+    """
+
+    channel_id: int
+    size: int
+    own_ratio: float = 0.1
+    link_ratio: float = 0.05
+    attachment_ratio: float = 0.05
+    start_ms: int = EPOCH_MS + 200 * 24 * 3600 * 1000
+    deleted: set = field(default_factory=set)
+
+    STEP_MS = 60_000
+    cdn_base = "https://cdn.example.com"  # MockDiscord.start points this at its own /cdn route
+
+    def message_id(self, index):
+        return snowflake(self.start_ms + index * self.STEP_MS, index)
+
+    def floor_index(self, message_id):
+        """Largest index whose message id is <= message_id (may fall outside the history)."""
+        index = ((message_id >> 22) + EPOCH_MS - self.start_ms) // self.STEP_MS
+        if self.message_id(index) > message_id:
+            index -= 1
+        return index
+
+    def payload(self, index):
+        rng = random.Random(self.channel_id * 1_000_003 + index)
+        message_id = self.message_id(index)
+        author_id = SELF_ID if rng.random() < self.own_ratio else rng.choice(OTHER_IDS)
+        content = " ".join(rng.choices(WORDS, k=rng.randint(2, 12)))
+        if rng.random() < self.link_ratio:
+            content += " https://example.com/" + str(index)
+        attachments = []
+        if rng.random() < self.attachment_ratio:
+            attachments.append({
+                "id": str(message_id + 1),
+                "filename": f"file{index}.png",
+                "size": 1024,
+                "url": f"{self.cdn_base}/{index}.png",
+                "proxy_url": f"https://media.example.com/{index}.png",
+                "content_type": "image/png",
+            })
+        return message_payload(self.channel_id, message_id, author_id, content, attachments)
+
+    def page(self, limit, before=None, after=None):
+        """Indexes for one history page, newest first (or oldest first when only `after` is set)."""
+        high = self.size - 1 if before is None else min(self.floor_index(before - 1), self.size - 1)
+        low = 0 if after is None else max(self.floor_index(after) + 1, 0)
+        if before is None and after is not None:
+            indexes = range(low, high + 1)
+        else:
+            indexes = range(high, low - 1, -1)
+        out = []
+        for index in indexes:
+            if self.message_id(index) in self.deleted:
+                continue
+            out.append(index)
+            if len(out) >= limit:
+                break
+        return out
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose content-type is exactly application/json (no charset)
+    headers = dict(headers or {}, **{"Content-Type": "application/json"})
+    return web.Response(body=json.dumps(data).encode(), status=status, headers=headers)
+
+
+def message_payload(channel_id, message_id, author_id, content, attachments=()):
+    ms = (message_id >> 22) + EPOCH_MS
+    return {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "author": {"id": str(author_id), "username": f"user{author_id % 1000}", "discriminator": "0", "avatar": None, "global_name": None},
+        "content": content,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ms / 1000)) + f".{ms % 1000:03d}000+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": list(attachments),
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+        "flags": 0,
+    }
+
+
+class MockDiscord:
+    def __init__(self, channels, buckets=None, latency=0.0):
+        self.channels = {channel.channel_id: channel for channel in channels}
+        self.bucket_configs = dict(DEFAULT_BUCKETS, **(buckets or {}))
+        self.latency = latency
+        self.buckets = {}
+        self.timeline = []  # (monotonic time, method, route, status)
+        self.delete_times = {}  # message id -> perf_counter() when the delete arrived
+        self.cdn_requests = 0
+        self._runner = None
+        self.port = None
+
+    # --- plumbing ---
+
+    def _bucket(self, route, channel_id):
+        config = self.bucket_configs.get(route)
+        if config is None:
+            return None
+        key = (route, channel_id)
+        if key not in self.buckets:
+            self.buckets[key] = Bucket(route, config)
+        return self.buckets[key]
+
+    async def _guard(self, request, route, channel_id=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        bucket = self._bucket(route, channel_id)
+        if bucket and not bucket.take(now):
+            retry_after = max(bucket.reset_at - now, 0.001)
+            self.timeline.append((now, request.method, route, 429))
+            headers = bucket.headers(now)
+            headers["Retry-After"] = f"{retry_after:.3f}"
+            body = {"message": "You are being rate limited.", "retry_after": retry_after, "global": False}
+            return None, json_response(body, status=429, headers=headers)
+        self.timeline.append((now, request.method, route, 200))
+        return (bucket.headers(now) if bucket else {"Via": "1.1 google"}), None
+
+    def _channel(self, request):
+        channel = self.channels.get(int(request.match_info["channel_id"]))
+        if channel is None:
+            raise web.HTTPNotFound(body=json.dumps({"message": "Unknown Channel", "code": 10003}).encode(), headers={"Content-Type": "application/json"})
+        return channel
+
+    # --- routes ---
+
+    async def me(self, request):
+        return json_response({
+            "id": str(SELF_ID), "username": "bench", "discriminator": "0", "avatar": None,
+            "global_name": None, "email": None, "verified": True, "mfa_enabled": False, "flags": 0,
+        }, headers={"Via": "1.1 google"})
+
+    async def history(self, request):
+        channel = self._channel(request)
+        headers, limited = await self._guard(request, "GET /channels/{id}/messages", channel.channel_id)
+        if limited:
+            return limited
+        query = request.query
+        limit = min(int(query.get("limit", 50)), 100)
+        before = int(query["before"]) if "before" in query else None
+        after = int(query["after"]) if "after" in query else None
+        indexes = channel.page(limit, before=before, after=after)
+        return json_response([channel.payload(i) for i in indexes], headers=headers)
+
+    async def delete(self, request):
+        channel = self._channel(request)
+        headers, limited = await self._guard(request, "DELETE /channels/{id}/messages/{id}", channel.channel_id)
+        if limited:
+            return limited
+        message_id = int(request.match_info["message_id"])
+        self.delete_times[message_id] = time.perf_counter()
+        if message_id in channel.deleted:
+            return json_response({"message": "Unknown Message", "code": 10008}, status=404, headers=headers)
+        channel.deleted.add(message_id)
+        return web.Response(status=204, headers=headers)
+
+    async def bulk_delete(self, request):
+        channel = self._channel(request)
+        headers, limited = await self._guard(request, "POST /channels/{id}/messages/bulk-delete", channel.channel_id)
+        if limited:
+            return limited
+        data = await request.json()
+        now = time.perf_counter()
+        for message_id in map(int, data.get("messages", [])):
+            self.delete_times[message_id] = now
+            channel.deleted.add(message_id)
+        return web.Response(status=204, headers=headers)
+
+    async def search(self, request):
+        channel = self._channel(request)
+        headers, limited = await self._guard(request, "GET /channels/{id}/messages/search", channel.channel_id)
+        if limited:
+            return limited
+        query = request.query
+        limit = min(int(query.get("limit", 25)), 25)
+        max_id = int(query["max_id"]) if "max_id" in query else None
+        authors = {int(a) for a in query.getall("author_id", [])}
+        has = set(query.getall("has", []))
+        hits = []
+        total = 0
+        # Brute force is fine for a benchmark stand-in; the client-side cost is what we measure
+        for index in range(channel.size - 1, -1, -1):
+            payload = channel.payload(index)
+            message_id = int(payload["id"])
+            if message_id in channel.deleted:
+                continue
+            if authors and int(payload["author"]["id"]) not in authors:
+                continue
+            if "link" in has and "http" not in payload["content"]:
+                continue
+            if "file" in has and not payload["attachments"]:
+                continue
+            total += 1
+            if (max_id is None or message_id < max_id) and len(hits) < limit:
+                hits.append([payload])
+        return json_response({"total_results": total, "messages": hits}, headers=headers)
+
+    async def cdn(self, request):
+        self.cdn_requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(body=b"\0" * ATTACHMENT_BYTES, content_type="image/png")
+
+    # --- lifecycle ---
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/api/v9/users/@me", self.me)
+        app.router.add_get("/api/v9/channels/{channel_id}/messages", self.history)
+        app.router.add_get("/api/v9/channels/{channel_id}/messages/search", self.search)
+        app.router.add_post("/api/v9/channels/{channel_id}/messages/bulk-delete", self.bulk_delete)
+        app.router.add_delete("/api/v9/channels/{channel_id}/messages/{message_id}", self.delete)
+        app.router.add_get("/cdn/{name}", self.cdn)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        SyntheticChannel.cdn_base = f"http://{host}:{self.port}/cdn"
+        return f"http://{host}:{self.port}/api/v9"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def summary(self):
+        by_route = {}
+        for _, method, route, status in self.timeline:
+            entry = by_route.setdefault(route, {"requests": 0, "429": 0})
+            entry["requests"] += 1
+            if status == 429:
+                entry["429"] += 1
+        return by_route
+
+
+class GatewayStandIn:
+    """
+    Emits MESSAGE_CREATE dispatch frames (JSON text, as the websocket would
+    deliver them) at `rate` events/sec and hands them to `on_frame`.
+    """
+
+    def __init__(self, channel_ids, rate, duration, target_ratio=0.1, watch_word="spam", seed=7):
+        self.channel_ids = channel_ids
+        self.rate = rate
+        self.duration = duration
+        self.target_ratio = target_ratio
+        self.watch_word = watch_word
+        self.rng = random.Random(seed)
+        self.sent_at = {}  # message id -> perf_counter() at emission
+        self.targets = set()  # ids that should be auto-deleted
+
+    def frame(self, seq):
+        now_ms = int(time.time() * 1000)
+        message_id = snowflake(now_ms, seq)
+        channel_id = self.rng.choice(self.channel_ids)
+        words = self.rng.choices([w for w in WORDS if w != self.watch_word], k=self.rng.randint(2, 12))
+        if self.rng.random() < self.target_ratio:
+            words.append(self.watch_word)
+            self.targets.add(message_id)
+        data = message_payload(channel_id, message_id, self.rng.choice(OTHER_IDS), " ".join(words))
+        return message_id, json.dumps({"op": 0, "t": "MESSAGE_CREATE", "s": seq, "d": data})
+
+    async def run(self, on_frame):
+        interval = 1 / self.rate
+        start = time.perf_counter()
+        seq = 0
+        while time.perf_counter() - start < self.duration:
+            seq += 1
+            message_id, frame = self.frame(seq)
+            self.sent_at[message_id] = time.perf_counter()
+            on_frame(frame)
+            next_at = start + seq * interval
+            delay = next_at - time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+        return seq
@@ -1,35 +1,118 @@
 import discord
 from discord.ext import commands
 import os
+import sys
 import asyncio
 import logging
 import re
-from datetime import datetime
+import atexit
+import queue
+import threading
+import json
+import random
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+import collections.abc
+import itertools
+import contextvars
+from collections import Counter, deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from dotenv import load_dotenv
 from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.logging import RichHandler
-from rich.text import Text
+from rich.markup import escape
+# Rich widgets (Panel, Table, Live) and sqlite3 are imported where they are used, keeping startup lean
 
+STARTED_AT = time.monotonic()
 
 
 # Initialize Rich Console
 console = Console()
 
 # Logging configuration
+# Records are queued on the event loop and written (file + terminal) by a listener thread,
+# so slow terminals and disks never stall gateway heartbeats or the next delete.
+LOG_PATH = 'purger_selfbot.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(
+    log_queue,
+    RotatingFileHandler(LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"),
+    RichHandler(console=console, rich_tracebacks=True),
+    respect_handler_level=True
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(message)s',
     datefmt="[%X]",
-    handlers=[
-        logging.FileHandler('purger_selfbot.log'),
-        RichHandler(console=console, rich_tracebacks=True)
-    ]
+    handlers=[QueueHandler(log_queue)]
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger("purger")
 
+
+class ActivityLog:
+    """
+    Per-delete console lines, rendered off the event loop.
+    The loop only enqueues a tuple; a writer thread formats and prints every FLUSH_INTERVAL.
+    Modes: verbose (one line per delete, collapsed into summaries during bursts),
+    summary (always one line per channel per interval), quiet (nothing per delete).
+    """
+    MODES = ("verbose", "summary", "quiet")
+    FLUSH_INTERVAL = 0.5
+    BURST_LINES = 8 # More lines than this per interval get coalesced even in verbose mode
+
+    def __init__(self, mode="verbose"):
+        self.mode = mode
+        self._events = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, label, channel_name, prefix, content):
+        """Queues one deleted message. Cheap enough to call for every delete on the loop."""
+        if self.mode == "quiet":
+            return
+        self._events.put((label, channel_name, prefix, content))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="purger-activity", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Writes everything queued so far; also called when a purge ends so its summary lands last."""
+        with self._lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._events.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            if self.mode == "verbose" and len(batch) <= self.BURST_LINES:
+                for label, channel_name, prefix, content in batch:
+                    # Truncate content for cleaner output and keep it on one line
+                    content = (content[:500] + '...') if len(content) > 500 else content
+                    content = escape(content.replace("\n", " "))
+                    console.print(f"[bold red]🔥 [{label}][/bold red] {prefix} [dim]|[/dim] [white]{content}[/white]")
+                return
+            counts = Counter((label, channel_name) for label, channel_name, _, _ in batch)
+            for (label, channel_name), count in counts.items():
+                console.print(f"[bold red]🔥 [{label}][/bold red] [cyan]{count}[/cyan] messages [dim]|[/dim] [green]#{channel_name}[/green] [dim](coalesced)[/dim]")
+
+
+activity_log = ActivityLog()
+
 def draw_banner():
     banner_text = r"""
     [magenta]
@@ -50,6 +133,7 @@ def draw_banner():
     [cyan]        >> DISCORD MESSAGE PURGER SELFBOT << [/cyan]
     [bold yellow]              Created by GH0ST [/bold yellow]
     """
+    from rich.panel import Panel
     console.print(Panel(banner_text.strip(), border_style="magenta"))
 
 # Load environment variables (mostly for legacy or other config)
@@ -67,57 +151,3467 @@ def get_token():
                     return line
     return os.getenv("DISCORD_BOT_TOKEN")
 
-TOKEN = get_token()
+TOKEN = get_token()
+
+
+# Selfbot configuration
+# Client profile, picked with PURGER_PROFILE=lean|full (default lean).
+# Lean skips work the purger never uses: member chunking at startup, presence
+# sync, voice-state member caching and the message cache (the index is kept in
+# sync from raw events instead). Guild subscriptions stay on, because without
+# them large guilds stop dispatching on_message to the watchers and the
+# thread cache used by .multipurge stays empty.
+CLIENT_PROFILES = {
+    "lean": {
+        "chunk_guilds_at_startup": False,
+        "sync_presence": False,
+        "max_messages": None,
+        "member_cache_flags": discord.MemberCacheFlags(voice=False),
+    },
+    "full": {},
+}
+STARTUP_PROFILE = os.getenv("PURGER_PROFILE", "lean").lower()
+if STARTUP_PROFILE not in CLIENT_PROFILES:
+    logger.warning(f"Unknown PURGER_PROFILE {STARTUP_PROFILE!r}, using lean")
+    STARTUP_PROFILE = "lean"
+
+bot = commands.Bot(command_prefix=".", self_bot=True, **CLIENT_PROFILES[STARTUP_PROFILE])
+
+# Global configuration state
+target_user_id = None
+watched_words = []
+
+URL_REGEX = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+URL_PATTERN = re.compile(URL_REGEX)
+INDEX_PATH = "purger_index.db"
+CHECKPOINT_PATH = "purger_checkpoints.json"
+PROTECTION_PATH = "purger_protection.json"
+
+
+def _trie_pattern(node):
+    """
+    Turns a character trie into a regex fragment. Shared prefixes are emitted
+    once, so the compiled pattern behaves like a single automaton instead of
+    one alternative per word.
+    """
+    optional = "" in node
+    branches = []
+    singles = []
+    for ch in sorted(k for k in node if k):
+        child = node[ch]
+        if len(child) == 1 and "" in child:
+            singles.append(re.escape(ch))
+        else:
+            branches.append(re.escape(ch) + _trie_pattern(child))
+
+    if singles:
+        branches.append(singles[0] if len(singles) == 1 else "[" + "".join(singles) + "]")
+
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if optional:
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+
+class WatchMatcher:
+    """
+    Compiled matcher for the watch word list.
+
+    Entries are plain (case-folded substring), `word:<text>` (whole word only)
+    or `re:<pattern>` (case-insensitive regex). Each group is compiled into one
+    pattern, so a message is scanned once no matter how many words are watched.
+    Call `rebuild()` whenever the word list changes.
+    """
+
+    # Below this many plain words a C-level `in` loop beats the compiled trie
+    SMALL_SET = 16
+
+    def __init__(self, words=()):
+        self.rebuild(words)
+
+    def rebuild(self, words):
+        substrings = {}
+        whole_words = {}
+        regexes = []
+
+        for entry in words:
+            if entry.startswith("word:") and len(entry) > 5:
+                whole_words.setdefault(entry[5:].casefold(), entry)
+            elif entry.startswith("re:") and len(entry) > 3:
+                try:
+                    regexes.append((re.compile(entry[3:], re.IGNORECASE), entry))
+                except re.error as e:
+                    logger.warning(f"Skipping invalid watch regex {entry!r}: {e}")
+            elif entry:
+                substrings.setdefault(entry.casefold(), entry)
+
+        self._substrings = substrings
+        self._whole_words = whole_words
+        self._regexes = regexes
+        self._substring_re = self._compile_trie(substrings)
+        self._word_re = self._compile_trie(whole_words, whole_word=True)
+        self._regex_any = re.compile("|".join(f"(?:{r.pattern})" for r, _ in regexes), re.IGNORECASE) if regexes else None
+
+    @staticmethod
+    def _compile_trie(words, whole_word=False):
+        if not words:
+            return None
+        root = {}
+        for word in words:
+            node = root
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        pattern = _trie_pattern(root)
+        if whole_word:
+            pattern = rf"(?<!\w){pattern}(?!\w)"
+        return re.compile(pattern)
+
+    def __bool__(self):
+        return bool(self._substrings or self._whole_words or self._regexes)
+
+    def search(self, content):
+        """Returns the watch entry that matched `content`, or None."""
+        if not content or not self:
+            return None
+
+        folded = content.casefold()
+        if len(self._substrings) <= self.SMALL_SET:
+            for word, entry in self._substrings.items():
+                if word in folded:
+                    return entry
+        elif self._substring_re:
+            match = self._substring_re.search(folded)
+            if match:
+                return self._substrings[match.group()]
+        if self._word_re:
+            match = self._word_re.search(folded)
+            if match:
+                return self._whole_words[match.group()]
+        if self._regex_any and self._regex_any.search(content):
+            for regex, entry in self._regexes:
+                if regex.search(content):
+                    return entry
+        return None
+
+
+watch_matcher = WatchMatcher()
+
+
+# --- Runtime metrics ---
+
+# Seconds; shared by every latency histogram so they can be compared side by side
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOOP_LAG_INTERVAL = 0.5
+METRICS_PORT = os.getenv("PURGER_METRICS_PORT") # Serve /metrics on 127.0.0.1:<port> when set
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimates the q-quantile by interpolating inside the bucket that holds it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = LATENCY_BUCKETS[index - 1] if index else 0.0
+                high = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return LATENCY_BUCKETS[-1]
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms, keyed by name plus labels.
+    Hot paths only bump a dict entry; formatting happens when `.stats` or the
+    optional Prometheus endpoint asks for it. Deletion totals are read from the
+    DeleteScheduler and 429s from the discord.http log counter at that point.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.loop_lag_last = 0.0
+        self._lag_task = None
+        self._server = None
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def instrument(self, http):
+        """Times every REST call by route template: history pages, deletes, search, bulk-delete."""
+        request = http.request
+
+        async def timed_request(route, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await request(route, *args, **kwargs)
+            finally:
+                self.observe("http_request_seconds", time.perf_counter() - started, route=f"{route.method} {route.path}")
+
+        http.request = timed_request
+
+    async def _measure_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag_last = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
+            self.observe("event_loop_lag_seconds", self.loop_lag_last)
+
+    async def start(self):
+        """Starts the loop-lag probe and, if PURGER_METRICS_PORT is set, the /metrics endpoint. Idempotent."""
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._measure_loop_lag())
+        if METRICS_PORT and self._server is None:
+            from aiohttp import web
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_scrape)
+            self._server = web.AppRunner(app, access_log=None)
+            await self._server.setup()
+            await web.TCPSite(self._server, "127.0.0.1", int(METRICS_PORT)).start()
+            logger.info(f"Metrics available at http://127.0.0.1:{METRICS_PORT}/metrics")
+
+    async def _handle_scrape(self, request):
+        from aiohttp import web
+        return web.Response(text=self.render_prometheus(), content_type="text/plain", headers={"X-Content-Type-Options": "nosniff"})
+
+    def snapshot_counters(self):
+        """Counters plus the totals other components already keep, as {(name, labels): value}."""
+        values = dict(self.counters)
+        values[("delete_requests_total", (("kind", "single"),))] = delete_scheduler.attempted - delete_scheduler.bulk_requests
+        values[("delete_requests_total", (("kind", "bulk"),))] = delete_scheduler.bulk_requests
+        values[("messages_deleted_total", ())] = delete_scheduler.deleted
+        values[("delete_failures_total", ())] = delete_scheduler.failed
+        values[("delete_retries_after_429_total", ())] = delete_scheduler.rate_limited
+        for route, count in rate_limit_hits.items():
+            values[("rate_limited_total", (("route", route),))] = count
+        values[("auto_delete_dropped_total", ())] = auto_deleter.dropped
+        values[("gateway_messages_dropped_total", ())] = message_filter.dropped
+        values[("archived_messages_total", ())] = archive.written
+        values[("archive_dropped_total", ())] = archive.dropped
+        for result in ("saved", "failed", "skipped"):
+            values[("archived_files_total", (("result", result),))] = getattr(archive, f"files_{result}")
+        return values
+
+    def gauges(self):
+        return {
+            "auto_delete_queue_depth": auto_deleter.depth(),
+            "active_purges": len(active_pipelines),
+            "jobs_running": len(jobs.running()),
+            "jobs_queued": len(jobs.queued()),
+            "delete_delay_seconds": delete_scheduler.delay,
+            "event_loop_lag_last_seconds": self.loop_lag_last,
+        }
+
+    def render_prometheus(self):
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.snapshot_counters().items()):
+            metric = f"purger_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{label_text(labels)} {value}")
+        for name, value in self.gauges().items():
+            lines.append(f"# TYPE purger_{name} gauge")
+            lines.append(f"purger_{name} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f"purger_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{label_text(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.instrument(bot.http)
+
+
+# --- Profiling (.profile) ---
+
+PROFILE_SAMPLE_INTERVAL = 0.005 # Stack sampler period for the collapsed-stack file
+PROFILE_TOP = 40 # Rows per table in the text report
+
+
+class TaskTiming:
+    __slots__ = ("created", "steps", "busy", "slowest")
+
+    def __init__(self):
+        self.created = 0
+        self.steps = 0
+        self.busy = 0.0
+        self.slowest = 0.0
+
+
+class TimedCoroutine(collections.abc.Coroutine):
+    """Wraps a task's coroutine and times each step the event loop runs it for."""
+
+    __slots__ = ("_coro", "_timing")
+
+    def __init__(self, coro, timing):
+        self._coro = coro
+        self._timing = timing
+
+    def _timed(self, step, *args):
+        started = time.perf_counter()
+        try:
+            return step(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            timing = self._timing
+            timing.steps += 1
+            timing.busy += elapsed
+            if elapsed > timing.slowest:
+                timing.slowest = elapsed
+
+    def send(self, value):
+        return self._timed(self._coro.send, value)
+
+    def throw(self, *args):
+        return self._timed(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    def __getattr__(self, name):
+        return getattr(self._coro, name) # cr_frame, __qualname__... for task repr and stacks
+
+
+class ProfileSession:
+    """
+    One profiling window: cProfile on the event-loop thread, a task factory
+    that times every task step, a stack sampler for flamegraphs and, with
+    `mem`, tracemalloc. Nothing here is installed until `.profile on`.
+    """
+
+    def __init__(self, memory=False):
+        import cProfile
+        self.memory = memory
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.tasks = {}
+        self.stacks = Counter()
+        self._loop = asyncio.get_running_loop()
+        self._previous_factory = self._loop.get_task_factory()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="purger-profile-sampler", daemon=True)
+        self._baseline = None
+        self._memory_snapshot = None
+        self._report_numbers = itertools.count(1) # Dumps may run in parallel threads; next() is atomic
+
+    def start(self):
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+            self._baseline = tracemalloc.take_snapshot()
+        self._loop.set_task_factory(self._task_factory)
+        self._sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self._loop.set_task_factory(self._previous_factory)
+        self._stop.set()
+        self._sampler.join()
+        if self.memory:
+            import tracemalloc
+            self._memory_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    def _task_factory(self, loop, coro, **kwargs):
+        key = getattr(coro, "__qualname__", type(coro).__name__)
+        timing = self.tasks.get(key)
+        if timing is None:
+            timing = self.tasks[key] = TaskTiming()
+        timing.created += 1
+        coro = TimedCoroutine(coro, timing)
+        if self._previous_factory is not None:
+            return self._previous_factory(loop, coro, **kwargs)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    def _sample(self):
+        wrapper_codes = {TimedCoroutine._timed.__code__, TimedCoroutine.send.__code__, TimedCoroutine.throw.__code__}
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code in wrapper_codes:
+                    frame = frame.f_back
+                    continue
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collect(self, resume=False):
+        """Copies everything a report needs. Runs on the loop thread, since cProfile is per-thread."""
+        import pstats
+        self.profile.disable()
+        stats = pstats.Stats(self.profile)
+        if resume:
+            self.profile.enable()
+        tasks = [(key, timing.created, timing.steps, timing.busy, timing.slowest) for key, timing in self.tasks.items()]
+        memory = None
+        if self.memory:
+            import tracemalloc
+            memory = self._memory_snapshot if not resume else tracemalloc.take_snapshot()
+        return stats, tasks, self.stacks.copy(), memory, time.perf_counter() - self.started
+
+    def write_report(self, label, collected):
+        """
+        Writes <stamp>.pstats, <stamp>.collapsed (flamegraph.pl / speedscope input)
+        and a <stamp>.txt summary next to the log file. Returns the .txt path.
+        """
+        import io
+        stats, tasks, stacks, memory, elapsed = collected
+        now = datetime.now()
+        # Milliseconds plus the report number, so a dump and the automatic stop never share a name
+        stamp = f"profile-{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}-{next(self._report_numbers)}"
+        base = os.path.join(os.path.dirname(os.path.abspath(LOG_PATH)), stamp)
+        stats.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        out = io.StringIO()
+        out.write(f"Profile of {label} | started {self.started_at:%Y-%m-%d %H:%M:%S} | {elapsed:.1f}s | {sum(stacks.values())} stack samples\n\n")
+        out.write("== Event-loop busy time by task coroutine ==\n")
+        out.write(f"{'coroutine':60} {'tasks':>7} {'steps':>9} {'busy s':>9} {'% wall':>7} {'max step ms':>12}\n")
+        for key, created, steps, busy, slowest in sorted(tasks, key=lambda row: row[3], reverse=True)[:PROFILE_TOP]:
+            out.write(f"{key[:60]:60} {created:7} {steps:9} {busy:9.3f} {busy / elapsed * 100:6.1f}% {slowest * 1000:12.1f}\n")
+        for sort in ("cumulative", "tottime"):
+            out.write(f"\n== cProfile, sorted by {sort} ==\n")
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(PROFILE_TOP)
+        if memory is not None:
+            out.write("\n== tracemalloc: growth since .profile on ==\n")
+            for stat in memory.compare_to(self._baseline, "lineno")[:PROFILE_TOP]:
+                out.write(f"{stat}\n")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        return base + ".txt"
+
+
+class Profiler:
+    """Owns at most one ProfileSession; a session ends with `.profile off` or when a purge finishes."""
+
+    def __init__(self):
+        self.session = None
+
+    def start(self, memory=False):
+        self.session = ProfileSession(memory=memory)
+        self.session.start()
+
+    async def stop(self, label):
+        session, self.session = self.session, None
+        session.stop()
+        return await asyncio.to_thread(session.write_report, label, session.collect())
+
+    async def dump(self):
+        """Writes a report of the session so far and keeps profiling."""
+        return await asyncio.to_thread(self.session.write_report, "running session", self.session.collect(resume=True))
+
+    async def purge_finished(self, label):
+        """Called when a purge ends; closes the window and writes its report."""
+        if self.session is None:
+            return
+        path = await self.stop(label)
+        console.print(f"[bold magenta]🔬 Profile written: {path}[/bold magenta]")
+
+
+profiler = Profiler()
+
+
+# --- Rate-limit-aware deletion ---
+
+DELETE_ROUTE = "DELETE /channels/{channel_id}/messages/{message_id}"
+BULK_DELETE_ROUTE = "POST /channels/{channel_id}/messages/bulk-delete"
+BULK_DELETE_MAX = 100 # Ids per bulk-delete call
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5) # Discord's cutoff, minus slack for a long purge
+BULK_DELETE_BOTS_ONLY = (20001, 20002) # Error codes meaning this account type can't use the endpoint
+_ROUTE_ID_REGEX = re.compile(r"\d{15,}")
+
+# 429s seen by discord.py's HTTP layer, keyed by normalized route
+rate_limit_hits = Counter()
+
+
+class RateLimitCounter(logging.Handler):
+    """
+    discord.py retries 429s internally and only logs them, so we count them
+    by listening to its HTTP logger instead of wrapping every request.
+    """
+
+    def emit(self, record):
+        if not str(record.msg).startswith("We are being rate limited") or len(record.args or ()) < 2:
+            return
+        method, url = record.args[0], str(record.args[1])
+        path = url.split("/api/v", 1)[-1].split("/", 1)[-1].split("?", 1)[0]
+        route = f"{method} /{_ROUTE_ID_REGEX.sub('{id}', path)}"
+        rate_limit_hits[route] += 1
+
+
+_rate_limit_counter = RateLimitCounter(level=logging.WARNING)
+logging.getLogger("discord.http").addHandler(_rate_limit_counter)
+
+
+@dataclass(frozen=True)
+class PacingPolicy:
+    name: str
+    base_delay: float   # Starting gap between deletes (seconds)
+    min_delay: float    # Fastest the scheduler may go while the bucket has headroom
+    headroom: int       # Requests kept in reserve in each bucket window
+    max_rate: float = None  # Cap on deletes/sec summed over all channels
+    max_retries: int = 5
+    backoff_cap: float = 60.0
+
+
+SPEED_POLICIES = {
+    "safe": PacingPolicy("safe", base_delay=2.2, min_delay=1.0, headroom=2, max_rate=2.0),
+    "fast": PacingPolicy("fast", base_delay=1.2, min_delay=0.5, headroom=1, max_rate=4.0),
+    "insane": PacingPolicy("insane", base_delay=0.5, min_delay=0.0, headroom=0, max_rate=10.0, max_retries=3),
+}
+
+
+class DeleteScheduler:
+    """
+    Paces `message.delete()` calls against Discord's per-route buckets.
+
+    Before each delete it reads the bucket state discord.py keeps for the
+    delete route (remaining, reset-after) and spreads the remaining requests
+    over the window. The gap shrinks towards the policy minimum while the
+    bucket has headroom and doubles after a 429. Each channel has its own
+    bucket and slot, while `max_rate` caps the combined rate when several
+    channels are purged at once. Failed deletes are retried with bounded
+    backoff and reported, never silently dropped.
+
+    `delete_bulk()` sends up to 100 recent messages in one request through
+    the bulk-delete route, paced the same way against its own bucket.
+    """
+
+    def __init__(self, policy):
+        self.set_policy(policy)
+        self.attempted = 0
+        self.deleted = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.bulk_requests = 0
+        self.bulk_supported = True  # Cleared for the session once Discord refuses the endpoint
+        self._next_at = {}          # Per (route, channel) slot (the delete buckets are per channel)
+        self._global_next_at = 0.0  # Shared slot enforcing policy.max_rate
+
+    def set_policy(self, policy):
+        self.policy = policy
+        self.delay = policy.base_delay
+
+    def _bucket(self, channel_id, route=DELETE_ROUTE):
+        # discord.py keys buckets by "<bucket hash or route>:<major parameters>"
+        http = bot.http
+        bucket_hash = getattr(http, "_bucket_hashes", {}).get(route)
+        return getattr(http, "_buckets", {}).get(f"{bucket_hash or route}:{channel_id}")
+
+    async def _wait_turn(self, channel_id, route=DELETE_ROUTE):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = (route, channel_id)
+        start = max(now, self._next_at.get(slot, 0.0), self._global_next_at)
+        interval = self.delay
+
+        bucket = self._bucket(channel_id, route)
+        if bucket is not None and bucket.expires and bucket.expires > start:
+            spare = bucket.remaining - self.policy.headroom
+            if spare <= 0:
+                # Bucket exhausted: wait for the window to reset instead of eating a 429
+                start = bucket.expires
+            else:
+                interval = max(interval, (bucket.expires - start) / spare)
+
+        # Reserve our slot before sleeping so concurrent callers queue up behind it
+        self._next_at[slot] = start + interval
+        if self.policy.max_rate:
+            self._global_next_at = start + 1 / self.policy.max_rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def _backoff(self, channel_id, attempt, retry_after=None, route=DELETE_ROUTE):
+        if retry_after:
+            self.rate_limited += 1
+            self.delay = min(max(self.delay * 2, self.policy.base_delay), self.policy.backoff_cap)
+            wait = retry_after + random.uniform(0, 0.5)
+        else:
+            wait = min(2 ** attempt + random.uniform(0, 1), self.policy.backoff_cap)
+        slot = (route, channel_id)
+        self._next_at[slot] = max(self._next_at.get(slot, 0.0), asyncio.get_running_loop().time() + wait)
+        return wait
+
+    async def delete(self, message):
+        """Deletes `message` under the current policy. Returns True if it was deleted."""
+        policy = self.policy
+        started = time.perf_counter()
+        for attempt in range(policy.max_retries + 1):
+            await self._wait_turn(message.channel.id)
+            self.attempted += 1
+            retry_after = None
+            try:
+                await message.delete()
+            except discord.NotFound:
+                message_index.evict((message.id,))
+                return False # Already gone
+            except discord.Forbidden as e:
+                self.failed += 1
+                console.print(f"[bold red]❌ Cannot delete {message.id}: {e.text or 'Forbidden'}[/bold red]")
+                return False
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retry_after = getattr(e, "retry_after", None) or 5.0
+                elif e.status < 500:
+                    self.failed += 1
+                    console.print(f"[bold red]❌ API Error: {e}[/bold red]")
+                    return False
+            else:
+                self.deleted += 1
+                self.delay = max(policy.min_delay, self.delay * 0.9)
+                metrics.observe("delete_seconds", time.perf_counter() - started, kind="single") # Pacing included
+                return True
+
+            if attempt < policy.max_retries:
+                wait = self._backoff(message.channel.id, attempt, retry_after)
+                console.print(f"[bold yellow]⚠️ Delete failed ({'429' if retry_after else 'server error'}), retry {attempt + 1}/{policy.max_retries} in {wait:.2f}s...[/bold yellow]")
+
+        self.failed += 1
+        console.print(f"[bold red]❌ Gave up on message {message.id} after {policy.max_retries} retries.[/bold red]")
+        return False
+
+    async def delete_bulk(self, channel, messages):
+        """
+        Deletes 2-100 messages from `channel` in one request. Returns True on success;
+        False means nothing was deleted and the caller should fall back to `delete()`.
+        """
+        policy = self.policy
+        route = discord.http.Route("POST", "/channels/{channel_id}/messages/bulk-delete", channel_id=channel.id)
+        payload = {"messages": [str(message.id) for message in messages]}
+        started = time.perf_counter()
+        for attempt in range(policy.max_retries + 1):
+            await self._wait_turn(channel.id, BULK_DELETE_ROUTE)
+            self.attempted += 1
+            self.bulk_requests += 1
+            retry_after = None
+            try:
+                await bot.http.request(route, json=payload)
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retry_after = getattr(e, "retry_after", None) or 5.0
+                elif e.status < 500:
+                    if e.code in BULK_DELETE_BOTS_ONLY or e.status == 401:
+                        self.bulk_supported = False
+                        console.print("[bold yellow]⚠️ Bulk delete is not available to this account, using single deletes.[/bold yellow]")
+                    else:
+                        console.print(f"[bold yellow]⚠️ Bulk delete refused ({e.text or e.status}), deleting one by one.[/bold yellow]")
+                    return False
+            else:
+                self.deleted += len(messages)
+                metrics.observe("delete_seconds", time.perf_counter() - started, kind="bulk")
+                return True
+
+            if attempt < policy.max_retries:
+                wait = self._backoff(channel.id, attempt, retry_after, BULK_DELETE_ROUTE)
+                console.print(f"[bold yellow]⚠️ Bulk delete failed ({'429' if retry_after else 'server error'}), retry {attempt + 1}/{policy.max_retries} in {wait:.2f}s...[/bold yellow]")
+
+        console.print(f"[bold red]❌ Gave up on bulk delete after {policy.max_retries} retries, deleting one by one.[/bold red]")
+        return False
+
+    def rate_limit_count(self):
+        """429s on the delete routes, including the ones discord.py retried itself."""
+        return (
+            self.rate_limited
+            + rate_limit_hits["DELETE /channels/{id}/messages/{id}"]
+            + rate_limit_hits["POST /channels/{id}/messages/bulk-delete"]
+        )
+
+
+delete_scheduler = DeleteScheduler(SPEED_POLICIES["safe"])
+
+
+# --- Local message index ---
+
+class IndexedMessage:
+    """Lightweight stand-in for a discord.Message rebuilt from an index row."""
+
+    __slots__ = ("id", "channel", "author", "content", "attachments", "pinned")
+
+    def __init__(self, channel, row):
+        message_id, author_id, attachment_count, pinned, content = row
+        self.id = message_id
+        self.channel = channel
+        self.author = discord.Object(id=author_id)
+        self.content = content
+        self.attachments = [None] * attachment_count # Only the count is indexed
+        self.pinned = bool(pinned)
+
+    @property
+    def created_at(self):
+        return discord.utils.snowflake_time(self.id)
+
+    async def delete(self):
+        await self.channel.get_partial_message(self.id).delete()
+
+
+class MessageIndex:
+    """
+    SQLite index of every message a purge has scanned, plus the contiguous
+    id span ("snapshot") that is known to be complete for each channel.
+
+    `history()` is a drop-in for `channel.history(limit=...)`: messages newer
+    than the snapshot come from the network, the snapshot itself is served
+    from disk, and anything older is fetched and indexed on the way. Writes
+    are buffered and flushed in batches; deleted messages are evicted.
+    """
+
+    FLUSH_EVERY = 200
+    READ_CHUNK = 500
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            author_id INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            attachments INTEGER NOT NULL,
+            has_link INTEGER NOT NULL,
+            pinned INTEGER NOT NULL,
+            content TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel_id, id);
+        CREATE TABLE IF NOT EXISTS snapshots (
+            channel_id INTEGER PRIMARY KEY,
+            oldest_id INTEGER NOT NULL,
+            newest_id INTEGER NOT NULL,
+            complete INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._db = None
+        self._channels = None
+        self._pending = []
+        self._edited = []
+        self._pins = []
+        self._evicted = []
+
+    @property
+    def db(self):
+        if self._db is None:
+            import sqlite3
+            self._db = sqlite3.connect(self.path)
+            self._db.executescript(self.SCHEMA)
+            self._channels = {row[0] for row in self._db.execute("SELECT channel_id FROM snapshots")}
+        return self._db
+
+    def tracks(self, channel_id):
+        """True if this channel has indexed messages worth keeping in sync."""
+        self.db # Loads the tracked channel set on first use
+        return channel_id in self._channels
+
+    def record(self, message):
+        self._pending.append((
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.created_at.timestamp(),
+            len(message.attachments),
+            int(bool(URL_PATTERN.search(message.content))),
+            int(message.pinned),
+            message.content,
+        ))
+        if len(self._pending) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def edit(self, message_id, content):
+        self._edited.append((content, int(bool(URL_PATTERN.search(content))), message_id))
+        if len(self._edited) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def pin(self, message_id, pinned):
+        """Pins and unpins arrive as MESSAGE_UPDATE; `.whitelist pinned on` relies on the indexed flag."""
+        self._pins.append((int(pinned), message_id))
+        if len(self._pins) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def evict(self, message_ids):
+        self._evicted.extend((message_id,) for message_id in message_ids)
+        if len(self._evicted) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not (self._pending or self._edited or self._pins or self._evicted):
+            return
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self.db.executemany("UPDATE messages SET content = ?, has_link = ? WHERE id = ?", self._edited)
+            self.db.executemany("UPDATE messages SET pinned = ? WHERE id = ?", self._pins)
+            self.db.executemany("DELETE FROM messages WHERE id = ?", self._evicted)
+        self._pending.clear()
+        self._edited.clear()
+        self._pins.clear()
+        self._evicted.clear()
+
+    def snapshot(self, channel_id):
+        """Returns (oldest_id, newest_id, complete) for the channel, or None."""
+        row = self.db.execute(
+            "SELECT oldest_id, newest_id, complete FROM snapshots WHERE channel_id = ?", (channel_id,)
+        ).fetchone()
+        return (row[0], row[1], bool(row[2])) if row else None
+
+    def _save_snapshot(self, channel_id, oldest_id, newest_id, complete):
+        self.flush()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                (channel_id, oldest_id, newest_id, int(complete)),
+            )
+        self._channels.add(channel_id)
+
+    def _rows(self, channel_id, oldest_id, newest_id):
+        # Keyset pagination keeps memory flat on channels with millions of rows
+        upper = newest_id
+        while True:
+            self.flush()
+            rows = self.db.execute(
+                "SELECT id, author_id, attachments, pinned, content FROM messages "
+                "WHERE channel_id = ? AND id >= ? AND id <= ? ORDER BY id DESC LIMIT ?",
+                (channel_id, oldest_id, upper, self.READ_CHUNK),
+            ).fetchall()
+            yield from rows
+            if len(rows) < self.READ_CHUNK:
+                return
+            upper = rows[-1][0] - 1
+
+    async def history(self, channel, limit=None):
+        remaining = limit
+        snapshot = self.snapshot(channel.id)
+
+        if snapshot:
+            oldest_id, newest_id, complete = snapshot
+
+            # 1. Only messages newer than the snapshot hit the network
+            top_id = None
+            fetched = 0
+            async for message in channel.history(limit=remaining, after=discord.Object(id=newest_id), oldest_first=False):
+                top_id = top_id or message.id
+                fetched += 1
+                self.record(message)
+                yield message
+            if remaining is not None:
+                remaining -= fetched
+                if remaining <= 0:
+                    return
+            # Caught up with the snapshot, so it now extends to the newest message
+            if top_id:
+                self._save_snapshot(channel.id, oldest_id, top_id, complete)
+                newest_id = top_id
+
+            # 2. The indexed span is served from disk. Pins made while the bot was offline never
+            # reached the index, so with pinned protection on the channel's pins are asked for once
+            pinned_ids = await self._pinned_ids(channel) if protection.view.pinned else None
+            for row in self._rows(channel.id, oldest_id, newest_id):
+                message = IndexedMessage(channel, row)
+                if pinned_ids is not None and message.pinned != (message.id in pinned_ids):
+                    message.pinned = not message.pinned
+                    self.pin(message.id, message.pinned)
+                yield message
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+            if complete:
+                return
+            before = discord.Object(id=oldest_id)
+        else:
+            newest_id = None
+            before = None
+
+        # 3. Anything older than the snapshot is fetched and indexed on the way
+        last_id = None
+        fetched = 0
+        exhausted = False
+        try:
+            async for message in channel.history(limit=remaining, before=before):
+                newest_id = newest_id or message.id
+                last_id = message.id
+                fetched += 1
+                self.record(message)
+                yield message
+            exhausted = remaining is None or fetched < remaining
+        finally:
+            if last_id:
+                self._save_snapshot(channel.id, last_id, newest_id, exhausted)
+            elif snapshot and exhausted:
+                self._save_snapshot(channel.id, snapshot[0], newest_id, True)
+
+    async def _pinned_ids(self, channel):
+        try:
+            return {message.id for message in await channel.pins()}
+        except discord.HTTPException as e:
+            logger.warning(f"Could not list pins of {getattr(channel, 'name', channel.id)} ({e}), using the indexed pinned flags")
+            return None
+
+    def clear(self, channel_id=None):
+        self.flush()
+        with self.db:
+            if channel_id is None:
+                self.db.execute("DELETE FROM messages")
+                self.db.execute("DELETE FROM snapshots")
+                self._channels.clear()
+            else:
+                self.db.execute("DELETE FROM messages WHERE channel_id = ?", (channel_id,))
+                self.db.execute("DELETE FROM snapshots WHERE channel_id = ?", (channel_id,))
+                self._channels.discard(channel_id)
+
+    def count(self, channel_id):
+        self.flush()
+        return self.db.execute("SELECT COUNT(*) FROM messages WHERE channel_id = ?", (channel_id,)).fetchone()[0]
+
+    def complete_span(self, channel):
+        """(oldest_id, newest_id) if the channel is fully indexed up to its last message, else None."""
+        snapshot = self.snapshot(channel.id) if self.tracks(channel.id) else None
+        if not snapshot or not snapshot[2] or (channel.last_message_id or 0) > snapshot[1]:
+            return None
+        return snapshot[0], snapshot[1]
+
+    def indexed_messages(self, channel, oldest_id, newest_id):
+        """Indexed messages of the channel in [oldest_id, newest_id], newest first."""
+        for row in self._rows(channel.id, oldest_id, newest_id):
+            yield IndexedMessage(channel, row)
+
+    def count_matching(self, channel, predicate):
+        """Matching messages if the channel is fully indexed up to its last message, else None."""
+        span = self.complete_span(channel)
+        if span is None:
+            return None
+        return sum(1 for message in self.indexed_messages(channel, *span) if predicate(message))
+
+
+message_index = MessageIndex()
+
+
+# --- Content classification ---
+
+CLASSIFY_PAGE = 100 # Messages sent to the pool together; one history page
+CLASSIFY_OFFLOAD_MIN = 200_000 # Content chars x rules below which a page is classified inline
+CLASSIFY_MAX_RULES = 64 # Bits in a verdict mask; further rules always run inline
+CLASSIFY_WORKERS = int(os.getenv("PURGER_CLASSIFY_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1)))) # 0 = never offload
+
+classify_pool = None
+
+
+class ContentClassifier:
+    """
+    The content rules (word, re, has:link) of one compiled filter. For a big
+    enough page, PurgePipeline sends every candidate's content to a process
+    pool in one batch (see purger_classify.py) and gets one bitmask per
+    message back. The filter's content terms then read their bit instead of
+    running the check on the event loop; messages without a verdict fall
+    back to the inline check.
+    """
+
+    broken = False # Set for the session if the pool fails; everything stays inline
+
+    def __init__(self):
+        self.rules = []
+        self.verdicts = {}
+        self.offloaded = 0
+
+    def term(self, rule, inline):
+        """Registers a rule and returns the predicate for it."""
+        if len(self.rules) >= CLASSIFY_MAX_RULES:
+            return inline
+        bit = 1 << len(self.rules)
+        self.rules.append(rule)
+        verdicts = self.verdicts
+
+        def check(m):
+            mask = verdicts.get(m.id)
+            return inline(m) if mask is None else mask & bit != 0
+        return check
+
+    async def classify(self, messages):
+        """Fills in verdicts for a page of candidates, unless the page is cheap enough to check inline."""
+        global classify_pool
+        self.verdicts.clear()
+        if not messages or not CLASSIFY_WORKERS or ContentClassifier.broken:
+            return
+        if sum(len(m.content) for m in messages) * len(self.rules) < CLASSIFY_OFFLOAD_MIN:
+            return
+        import purger_classify
+        if classify_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: workers import only purger_classify instead of forking a live event loop
+            classify_pool = ProcessPoolExecutor(max_workers=CLASSIFY_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            masks = await asyncio.get_running_loop().run_in_executor(
+                classify_pool, purger_classify.classify_page, tuple(self.rules), [m.content for m in messages]
+            )
+        except Exception as e:
+            ContentClassifier.broken = True
+            logger.warning(f"Content classification pool failed ({e!r}), classifying inline from now on")
+            return
+        self.verdicts.update(zip((m.id for m in messages), masks))
+        self.offloaded += len(messages)
+        metrics.inc("messages_classified_offloaded_total", len(messages))
+
+
+# --- Filter expressions (.purge) ---
+
+# Relative evaluation cost of each term; AND/OR operands run cheapest first
+TERM_COSTS = {"before": 0, "after": 0, "pinned": 0, "own": 0, "all": 0, "author": 1, "has": 1, "word": 2, "link": 3, "re": 4}
+_EXPR_TOKEN = re.compile(r'\s*(?:(\()|(\))|((?:[^\s()"]|"(?:[^"\\]|\\.)*")+))')
+_MENTION = re.compile(r"<@!?(\d+)>|(\d{15,})")
+
+
+@dataclass(frozen=True)
+class CompiledFilter:
+    predicate: object   # message -> bool
+    search: dict = None # Search endpoint filters implied by the top-level ANDs (or None)
+    low_id: int = None  # `after:` bound (inclusive)
+    high_id: int = None # `before:` bound (exclusive)
+    limit: int = None   # `limit:N` (None = not given)
+
+
+def quote_value(value):
+    """Quotes a term value for use in a filter expression if it needs it."""
+    if value and not re.search(r'[\s()"\\]', value):
+        return value
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _EXPR_TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Unexpected character at position {pos}: {text[pos:pos + 10]!r}")
+        tokens.append(match.group(1) or match.group(2) or match.group(3))
+        pos = match.end()
+    return tokens
+
+
+def strip_dry_run(text):
+    """Removes standalone --dry-run tokens (not ones inside a quoted value). Returns (expression, dry_run)."""
+    cuts = []
+    pos = 0
+    while pos < len(text):
+        match = _EXPR_TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            break # Invalid expressions are reported by compile_expression
+        if match.group(3) == "--dry-run":
+            cuts.append((match.start(3), match.end(3)))
+        pos = match.end()
+    for start, end in reversed(cuts):
+        text = text[:start] + text[end:]
+    return text.strip(), bool(cuts)
+
+
+def _parse_term(token):
+    """Parses `key:value` or a bare keyword into ("term", key, value)."""
+    key, sep, value = token.partition(":")
+    key = key.lower()
+    if not sep:
+        if key in ("pinned", "own"):
+            return ("term", key, None)
+        if key in ("all", "everyone", "*"):
+            return ("term", "all", None)
+        raise ValueError(f"Unknown filter term: {token}")
+    if value.startswith('"'):
+        if len(value) < 2 or not value.endswith('"'):
+            raise ValueError(f"Unterminated quote in: {token}")
+        value = re.sub(r"\\(.)", r"\1", value[1:-1])
+    if not value:
+        raise ValueError(f"Missing value for {key}:")
+    if key in ("word", "re", "limit"):
+        return ("term", key, value)
+    if key in ("author", "from"):
+        if value.lower() == "me":
+            return ("term", "own", None)
+        match = _MENTION.fullmatch(value)
+        if not match:
+            raise ValueError(f"author: needs a mention, a user id or 'me', got {value}")
+        return ("term", "author", int(match.group(1) or match.group(2)))
+    if key == "has":
+        value = value.lower()
+        if value in ("link", "links"):
+            return ("term", "link", None)
+        if value in ("file", "files", "media", "attachment", "attachments"):
+            return ("term", "has", "file")
+        raise ValueError(f"has: supports link or file, got {value}")
+    if key in ("before", "after"):
+        return ("term", key, parse_bound(value))
+    raise ValueError(f"Unknown filter term: {token}")
+
+
+def parse_expression(text):
+    """
+    Parses a filter expression into a tree of ("and"|"or", [nodes]), ("not", node)
+    and ("term", key, value). AND binds tighter than OR; adjacent terms are ANDed.
+    """
+    tokens = _tokenize(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def keyword(token):
+        return token.upper() if token and token.upper() in ("AND", "OR", "NOT") else None
+
+    def parse_or():
+        nodes = [parse_and()]
+        while keyword(peek()) == "OR":
+            take()
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and():
+        nodes = [parse_not()]
+        while peek() is not None and peek() != ")" and keyword(peek()) != "OR":
+            if keyword(peek()) == "AND":
+                take()
+            nodes.append(parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not():
+        if keyword(peek()) == "NOT":
+            take()
+            return ("not", parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None:
+            raise ValueError("Expression ends too early")
+        take()
+        if token == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError("Missing closing parenthesis")
+            take()
+            return node
+        if token == ")" or keyword(token):
+            raise ValueError(f"Unexpected {token}")
+        return _parse_term(token)
+
+    if not tokens:
+        raise ValueError("Empty filter expression")
+    tree = parse_or()
+    if pos != len(tokens):
+        raise ValueError(f"Unexpected {tokens[pos]}")
+    return tree
+
+
+def _compile_node(node, classifier):
+    """Returns (predicate, cost) for a parsed node. Content terms register their rule with `classifier`."""
+    kind = node[0]
+    if kind == "not":
+        inner, cost = _compile_node(node[1], classifier)
+        return (lambda m: not inner(m)), cost
+    if kind in ("and", "or"):
+        compiled = sorted((_compile_node(child, classifier) for child in node[1]), key=lambda pair: pair[1])
+        preds = [pred for pred, _ in compiled]
+        cost = sum(cost for _, cost in compiled)
+        if len(preds) == 2:
+            first, second = preds
+            if kind == "and":
+                return (lambda m: first(m) and second(m)), cost
+            return (lambda m: first(m) or second(m)), cost
+        if kind == "and":
+            return (lambda m: all(pred(m) for pred in preds)), cost
+        return (lambda m: any(pred(m) for pred in preds)), cost
+
+    _, key, value = node
+    cost = TERM_COSTS.get(key, 0)
+    if key == "author":
+        return (lambda m: m.author.id == value), cost
+    if key == "own":
+        return (lambda m: m.author.id == bot.user.id), cost
+    if key == "all":
+        return (lambda m: True), cost
+    if key == "pinned":
+        return (lambda m: m.pinned), cost
+    if key == "before":
+        return (lambda m: m.id < value), cost
+    if key == "after":
+        return (lambda m: m.id >= value), cost
+    if key == "has":
+        return (lambda m: len(m.attachments) > 0), cost
+    if key == "link":
+        inline = lambda m: URL_PATTERN.search(m.content) is not None
+        return classifier.term(("re", URL_PATTERN.pattern, URL_PATTERN.flags), inline), cost
+    if key == "word":
+        word = value.lower()
+        return classifier.term(("word", word), lambda m: word in m.content.lower()), cost
+    if key == "re":
+        try:
+            regex = re.compile(value, re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid regex {value!r}: {e}")
+        return classifier.term(("re", value, re.IGNORECASE), lambda m: regex.search(m.content) is not None), cost
+    raise ValueError(f"{key}: is only allowed at the top level")
+
+
+def compile_expression(text):
+    """
+    Compiles a `.purge` expression into one predicate plus what the top-level
+    AND terms imply for the scan: search filters, id bounds and a scan limit.
+    """
+    tree = parse_expression(text)
+    conjuncts = tree[1] if tree[0] == "and" else [tree]
+
+    limit = None
+    search = {}
+    low_id = high_id = None
+    terms = []
+    for node in conjuncts:
+        if node[0] == "term" and node[1] == "limit":
+            if not node[2].isdigit():
+                raise ValueError(f"limit: needs a number, got {node[2]}")
+            limit = int(node[2])
+            continue
+        terms.append(node)
+        if node[0] != "term":
+            continue
+        _, key, value = node
+        if key == "after":
+            low_id = value if low_id is None else max(low_id, value)
+        elif key == "before":
+            high_id = value if high_id is None else min(high_id, value)
+        elif key == "author" and "authors" not in search:
+            search["authors"] = [discord.Object(id=value)]
+        elif key == "own" and "authors" not in search:
+            search["authors"] = [bot.user]
+        elif key == "link" and "has" not in search:
+            search["has"] = ["link"]
+        elif key == "has" and "has" not in search:
+            search["has"] = ["file"]
+        # word: is a substring match, search only matches whole words, so it never narrows the search
+
+    if not terms:
+        terms = [("term", "all", None)]
+    classifier = ContentClassifier()
+    predicate, _ = _compile_node(terms[0] if len(terms) == 1 else ("and", terms), classifier)
+    if classifier.rules:
+        predicate.classifier = classifier # Picked up by PurgePipeline; every compile builds fresh closures
+    return CompiledFilter(predicate, search or None, low_id, high_id, limit)
+
+
+# --- Filters & checkpoints ---
+
+def build_filter(spec):
+    """
+    Rebuilds a purge filter from its JSON-serialisable spec, so a checkpointed
+    job can be resumed with exactly the filter it was started with.
+    """
+    kind = spec["kind"]
+    if kind == "user":
+        if spec["user_id"] == "everyone":
+            return lambda m: True
+        user_id = spec["user_id"]
+        return lambda m: m.author.id == user_id
+    if kind == "word":
+        return compile_expression(f"word:{quote_value(spec['word'])}").predicate
+    if kind == "media":
+        return lambda m: len(m.attachments) > 0
+    if kind == "links":
+        return compile_expression("has:link").predicate
+    if kind == "own":
+        return lambda m: m.author.id == bot.user.id
+    if kind == "all":
+        return lambda m: True
+    if kind == "expr":
+        return compile_expression(spec["expr"]).predicate
+    raise ValueError(f"Unknown filter kind: {kind}")
+
+
+def spec_from_token(token):
+    """Parses a short filter token (own, all, media, links, word=x, user=id) into a spec."""
+    kind, _, value = token.partition("=")
+    kind = kind.lower()
+    if kind in ("own", "all", "media", "links"):
+        return {"kind": kind}
+    if kind == "everyone":
+        return {"kind": "all"}
+    if kind == "word" and value:
+        return {"kind": "word", "word": value}
+    if kind == "user" and value.isdigit():
+        return {"kind": "user", "user_id": int(value)}
+    raise ValueError(f"Unknown filter: {token}")
+
+
+def describe_spec(spec):
+    return ", ".join(f"{v}" if k == "kind" else f"{k}={v}" for k, v in spec.items())
+
+
+@dataclass
+class PurgeCheckpoint:
+    channel_id: int
+    spec: dict
+    limit: int = None       # Scan limit of the original command (None = full history)
+    after_id: int = None    # Lower id bound (e.g. .purge_since)
+    cursor_id: int = None   # Everything at or above this id has been processed
+    search_floor: int = None  # While search hits are unverified, the cursor stays at or above this id
+    scanned: int = 0
+    deleted: int = 0
+    updated_at: float = 0.0
+
+
+class CheckpointStore:
+    """
+    Keeps one checkpoint per channel in a JSON file. Updates are held in
+    memory and written at most every FLUSH_INTERVAL seconds, via a temp file
+    and os.replace(), so a crash never leaves a half-written file.
+    """
+
+    FLUSH_INTERVAL = 5.0
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self._checkpoints = None
+        self._dirty = False
+        self._flushed_at = 0.0
+
+    @property
+    def checkpoints(self):
+        if self._checkpoints is None:
+            self._checkpoints = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        for data in json.load(f).values():
+                            self._checkpoints[data["channel_id"]] = PurgeCheckpoint(**data)
+                except (OSError, ValueError, TypeError, KeyError) as e:
+                    logger.warning(f"Ignoring unreadable checkpoint file {self.path}: {e}")
+        return self._checkpoints
+
+    def get(self, channel_id):
+        return self.checkpoints.get(channel_id)
+
+    def start(self, channel_id, spec, limit=None, after_id=None):
+        checkpoint = PurgeCheckpoint(channel_id, spec, limit=limit, after_id=after_id)
+        self.checkpoints[channel_id] = checkpoint
+        self.update(force=True)
+        return checkpoint
+
+    def update(self, force=False):
+        self._dirty = True
+        if force or time.monotonic() - self._flushed_at >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def discard(self, channel_id):
+        if self.checkpoints.pop(channel_id, None):
+            self.update(force=True)
+
+    def flush(self):
+        if not self._dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(k): asdict(v) for k, v in self.checkpoints.items()}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+
+
+checkpoints = CheckpointStore()
+
+
+# --- Protection store (.whitelist) ---
+
+PROTECTION_COMPACT_AT = 200_000 # Above this many ids, keep them in a sorted array behind a Bloom filter
+BLOOM_BITS_PER_ID = 10 # ~1.8% false positives with 3 hashes; a false positive only costs a bisect
+
+
+class BloomFilter:
+    """Three-hash Bloom filter over 64-bit snowflakes. A false positive only costs the exact lookup behind it."""
+
+    def __init__(self, capacity):
+        self.size = max(64, capacity * BLOOM_BITS_PER_ID)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, value):
+        h = (value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        a, b = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(3):
+            p = (a + i * b) % self.size
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, value):
+        h = (value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        a, b = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits, size = self.bits, self.size
+        p = a % size
+        if not bits[p >> 3] >> (p & 7) & 1:
+            return False
+        p = (a + b) % size
+        if not bits[p >> 3] >> (p & 7) & 1:
+            return False
+        p = (a + 2 * b) % size
+        return bits[p >> 3] >> (p & 7) & 1 == 1
+
+
+class ProtectionView:
+    """
+    One immutable state of the protection store. Mutations build a new view
+    from the current one and never touch it, so protects() always sees either
+    the old or the new state as a whole, however long the rebuild takes.
+    """
+
+    __slots__ = ("ids", "compact_ids", "bloom", "authors", "ranges", "pinned", "starts", "ends", "active")
+
+    def __init__(self, ids=frozenset(), compact_ids=None, bloom=None, authors=frozenset(), ranges=(), pinned=False):
+        self.ids = ids
+        self.compact_ids = compact_ids # array("Q") once compacted; `ids` is then empty
+        self.bloom = bloom
+        self.authors = authors
+        self.ranges = ranges # Merged, sorted (low, high) pairs (inclusive)
+        self.pinned = pinned
+        self.starts = array("Q", (low for low, _ in ranges))
+        self.ends = array("Q", (high for _, high in ranges))
+        self.active = bool(len(self.all_ids()) or authors or ranges or pinned) # Keeps the common empty case to one test
+
+    def all_ids(self):
+        return self.compact_ids if self.compact_ids is not None else self.ids
+
+    def _replace(self, **changes):
+        fields = {name: getattr(self, name) for name in ("ids", "compact_ids", "bloom", "authors", "ranges", "pinned")}
+        fields.update(changes)
+        return ProtectionView(**fields)
+
+    def with_ids(self, ids):
+        if self.compact_ids is None and len(self.ids) + len(ids) <= PROTECTION_COMPACT_AT:
+            return self._replace(ids=frozenset(self.ids | ids))
+        merged = sorted(set(self.all_ids()) | ids)
+        bloom = BloomFilter(len(merged))
+        for message_id in merged:
+            bloom.add(message_id)
+        return self._replace(ids=frozenset(), compact_ids=array("Q", merged), bloom=bloom)
+
+    def without_id(self, message_id):
+        if self.compact_ids is None:
+            return self._replace(ids=self.ids - {message_id})
+        index = bisect_left(self.compact_ids, message_id)
+        if index == len(self.compact_ids) or self.compact_ids[index] != message_id:
+            return self
+        compact_ids = array("Q", self.compact_ids)
+        del compact_ids[index] # Its Bloom bits stay set; that only costs a bisect
+        return self._replace(compact_ids=compact_ids)
+
+    def with_ranges(self, ranges):
+        merged = []
+        for low, high in sorted(list(self.ranges) + [(min(a, b), max(a, b)) for a, b in ranges]):
+            if merged and low <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        return self._replace(ranges=tuple(tuple(pair) for pair in merged))
+
+    def without_range(self, low, high):
+        """Unprotects [low, high], splitting any range that only partly overlaps it."""
+        low, high = min(low, high), max(low, high)
+        kept = []
+        for start, end in self.ranges:
+            if end < low or start > high:
+                kept.append((start, end))
+                continue
+            if start < low:
+                kept.append((start, low - 1))
+            if end > high:
+                kept.append((high + 1, end))
+        return self._replace(ranges=tuple(kept))
+
+    def merged(self, data):
+        """This view plus the ids, authors, ranges and pinned flag of an exported/imported dict."""
+        view = self._replace(
+            authors=self.authors | frozenset(map(int, data.get("authors", ()))),
+            pinned=self.pinned or bool(data.get("pinned", False)),
+        )
+        view = view.with_ranges([(int(low), int(high)) for low, high in data.get("ranges", ())])
+        return view.with_ids(set(map(int, data.get("ids", ()))))
+
+
+class ProtectionStore:
+    """
+    Messages that must never be deleted: exact message ids, everything by
+    certain authors, snowflake (id/date) ranges and, optionally, pinned
+    messages. Persisted to PROTECTION_PATH (temp file + os.replace) and
+    loaded on first use.
+
+    `protects()` runs for every scanned and auto-deleted message, so it
+    checks precomputed structures: a set of author ids, merged ranges as
+    sorted start/end arrays (bisect, O(log n)) and the message ids as a
+    set. Past PROTECTION_COMPACT_AT ids they move to a sorted array of
+    uint64 (8 bytes each instead of ~65 in a set) with a Bloom filter in
+    front, so most unprotected ids never reach the bisect.
+
+    All of it lives in one ProtectionView. Commands build the next view in
+    a worker thread and publish it on the loop with a single assignment.
+    """
+
+    def __init__(self, path=PROTECTION_PATH):
+        self.path = path
+        self.loaded = False
+        self.view = ProtectionView()
+        self._lock = asyncio.Lock() # One mutation at a time, so none is lost
+
+    # --- loading & saving ---
+
+    def load(self):
+        if self.loaded:
+            return
+        data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable protection file {self.path}: {e}")
+        self.view = ProtectionView().merged(data)
+        self.loaded = True
+
+    def export(self):
+        view = self.view
+        return {
+            "ids": sorted(view.all_ids()),
+            "authors": sorted(view.authors),
+            "ranges": [list(pair) for pair in view.ranges],
+            "pinned": view.pinned,
+        }
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.export(), f)
+        os.replace(tmp_path, self.path)
+
+    # --- mutation (commands only; each one publishes a new view and saves) ---
+
+    async def update(self, change):
+        """Builds `change(current view)` off the loop, swaps it in on the loop, then saves."""
+        async with self._lock:
+            await asyncio.to_thread(self.load)
+            view = await asyncio.to_thread(change, self.view)
+            self.view = view
+            await asyncio.to_thread(self.save)
+
+    def all_ids(self):
+        return self.view.all_ids()
+
+    def id_count(self):
+        return len(self.view.all_ids())
+
+    async def add_ids(self, ids):
+        ids = set(ids)
+        await self.update(lambda view: view.with_ids(ids))
+
+    async def remove_id(self, message_id):
+        await self.update(lambda view: view.without_id(message_id))
+
+    async def add_author(self, author_id):
+        await self.update(lambda view: view._replace(authors=view.authors | {author_id}))
+
+    async def remove_author(self, author_id):
+        await self.update(lambda view: view._replace(authors=view.authors - {author_id}))
+
+    async def add_range(self, low, high):
+        await self.update(lambda view: view.with_ranges([(low, high)]))
+
+    async def remove_range(self, low, high):
+        await self.update(lambda view: view.without_range(low, high))
+
+    async def set_pinned(self, enabled):
+        await self.update(lambda view: view._replace(pinned=enabled))
+
+    async def import_data(self, data):
+        await self.update(lambda view: view.merged(data))
+
+    async def clear(self):
+        await self.update(lambda view: ProtectionView())
+
+    def summary(self):
+        view = self.view
+        compact = " (compact)" if view.compact_ids is not None else ""
+        pinned = ", pinned" if view.pinned else ""
+        return f"{len(view.all_ids())} ids{compact}, {len(view.authors)} authors, {len(view.ranges)} ranges{pinned}"
+
+    # --- lookup (hot path) ---
+
+    def protects(self, message):
+        if not self.loaded:
+            self.load()
+        view = self.view # One snapshot for the whole check
+        if not view.active:
+            return False
+        message_id = message.id
+        if message_id in view.ids:
+            return True
+        if view.bloom is not None and message_id in view.bloom:
+            index = bisect_left(view.compact_ids, message_id)
+            if index < len(view.compact_ids) and view.compact_ids[index] == message_id:
+                return True
+        if view.authors and message.author.id in view.authors:
+            return True
+        if view.starts:
+            index = bisect_right(view.starts, message_id) - 1
+            if index >= 0 and message_id <= view.ends[index]:
+                return True
+        return view.pinned and message.pinned
+
+
+protection = ProtectionStore()
+
+
+def read_protection_file(path):
+    """Reads a `.whitelist export` JSON file, or a text file with one message id per line."""
+    with open(path, "r") as f:
+        text = f.read()
+    if text.lstrip().startswith("{"):
+        return json.loads(text)
+    return {"ids": [int(line.split()[0]) for line in text.splitlines() if line.strip() and not line.startswith("#")]}
+
+
+def write_protection_file(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+# --- Search prefilter ---
+
+SEARCH_HEAD_SCAN = 100 # Newest messages read directly; the search index lags behind live chat
+
+
+def search_params(spec):
+    """Search endpoint filters equivalent to a filter spec, or None if search cannot narrow it."""
+    kind = spec["kind"]
+    if kind == "own":
+        return {"authors": [bot.user]}
+    if kind == "user" and spec["user_id"] != "everyone":
+        return {"authors": [discord.Object(id=spec["user_id"])]}
+    if kind == "links":
+        return {"has": ["link"]}
+    if kind == "media":
+        return {"has": ["file"]}
+    if kind == "expr":
+        return compile_expression(spec["expr"]).search
+    return None
+
+
+async def search_history(channel, spec, limit=None, before=None, checkpoint=None):
+    """
+    Candidate source for full-history purges with a sparse target. Instead of
+    paging through every message, candidates are listed through Discord's
+    message search (author, has:link, has:file) and the real filter still
+    runs on each of them. Content is never searched: Discord matches whole
+    words, the word filters match substrings. The newest SEARCH_HEAD_SCAN
+    messages are read directly since search indexing lags. If search is
+    unavailable, still indexing the channel, or returns fewer hits than it
+    reported, everything below the head scan is read normally, skipping
+    the hits already yielded. Until search is known to be complete, the
+    checkpoint cursor is held at the head-scan boundary (search_floor),
+    since the hits jump over history nobody has read yet.
+    """
+    if checkpoint is not None:
+        checkpoint.search_floor = None # A floor left by an interrupted run belongs to that run's search
+    params = search_params(spec) if limit is None else None
+    if params is None:
+        # A scan limit means "the newest N messages", which search cannot express
+        source = message_index.history(channel, limit=limit) if before is None else channel.history(limit=limit, before=before)
+        async for message in source:
+            yield message
+        return
+
+    boundary = before
+    async for message in channel.history(limit=SEARCH_HEAD_SCAN, before=before):
+        boundary = message
+        yield message
+    if boundary is before:
+        return # Nothing older than the cursor
+
+    complete = False
+    seen = 0
+    total = None
+    yielded = set()
+    if checkpoint is not None:
+        checkpoint.search_floor = boundary.id
+    try:
+        async for message in channel.search(limit=None, before=boundary, **params):
+            if total is None:
+                total = message.total_results or 0
+                if message.doing_deep_historical_index:
+                    break # Channel is still being indexed, results would be partial
+            seen += 1
+            if message.channel.id == channel.id:
+                yielded.add(message.id)
+                yield message
+        else:
+            complete = total is None or seen >= total
+    except (discord.HTTPException, ValueError) as e:
+        # ValueError: discord.py could not resolve a search endpoint for this channel
+        logger.info(f"Search unavailable in {getattr(channel, 'name', channel.id)} ({e}), falling back to a full scan")
+
+    if complete:
+        if checkpoint is not None:
+            checkpoint.search_floor = None
+        return
+    if checkpoint is not None and not yielded:
+        checkpoint.search_floor = None # Nothing below the boundary was yielded, the scan is still in order
+    console.print("[bold yellow]⚠️ Search coverage incomplete, scanning the remaining history...[/bold yellow]")
+    # Hits search missed can sit anywhere below the head scan, not just past the last hit
+    async for message in channel.history(limit=None, before=boundary):
+        if message.id not in yielded:
+            yield message
+
+
+# --- Snowflake range traversal ---
+
+RANGE_SEGMENT_SPAN = timedelta(days=30) # Id span handled by one segment walker
+RANGE_PREFETCH = 2                      # Segments fetched ahead of the one being consumed
+RANGE_SEGMENT_BUFFER = 200              # Messages buffered per prefetched segment
+
+
+def parse_bound(text):
+    """Parses a message id or a local YYYY-MM-DD[THH:MM] date into a snowflake."""
+    if text.isdigit() and len(text) >= 15:
+        return int(text)
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M"):
+        try:
+            return discord.utils.time_snowflake(datetime.strptime(text, fmt))
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date or message id: {text}")
+
+
+def split_range(low_id, high_id, span=RANGE_SEGMENT_SPAN):
+    """Splits the id range [low_id, high_id) into consecutive segments, newest first."""
+    step = int(span.total_seconds() * 1000) << 22 # Snowflakes store milliseconds above bit 22
+    segments = []
+    high = high_id
+    while high > low_id:
+        low = max(low_id, high - step)
+        segments.append((low, high))
+        high = low
+    return segments
+
+
+async def range_history(channel, low_id, high_id=None):
+    """
+    Yields messages with low_id <= id < high_id, newest first, touching only
+    the pages inside that window. The window is split into segments that
+    jump straight to their bounds with before/after, and the next
+    RANGE_PREFETCH segments are fetched while the current one is consumed.
+    """
+    if high_id is None:
+        high_id = discord.utils.time_snowflake(discord.utils.utcnow(), high=True) + 1
+    segments = split_range(low_id, high_id)
+
+    async def walk(low, high, queue):
+        try:
+            async for message in channel.history(
+                limit=None, after=discord.Object(id=low - 1), before=discord.Object(id=high), oldest_first=False
+            ):
+                await queue.put(message)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
+
+    running = []
+    def start(index):
+        if index < len(segments):
+            queue = asyncio.Queue(maxsize=RANGE_SEGMENT_BUFFER)
+            running.append((asyncio.create_task(walk(*segments[index], queue)), queue))
+
+    try:
+        for index in range(RANGE_PREFETCH + 1):
+            start(index)
+        for index in range(len(segments)):
+            task, queue = running[index]
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            start(index + RANGE_PREFETCH + 1)
+    finally:
+        for task, _ in running:
+            task.cancel()
+
+
+# --- Pre-delete archive ---
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_BUFFER = 10_000 # Records waiting for the writer thread; past this they are dropped, never waited on
+ARCHIVE_CHUNK_BYTES = 1 << 20 # Records are compressed and written in chunks of about this size
+ARCHIVE_FSYNC_INTERVAL = 5.0 # Seconds between flush + fsync; bounds what a crash can lose
+ARCHIVE_DOWNLOADERS = 4 # Concurrent attachment downloads
+ARCHIVE_DOWNLOAD_QUEUE = 1000 # Pending attachment downloads; past this they are skipped
+
+_ARCHIVE_STOP = object()
+
+
+def archive_record(message):
+    """A deleted message as plain JSON types. Messages served from the local index only carry content."""
+    channel = message.channel
+    reference = getattr(message, "reference", None)
+    edited_at = getattr(message, "edited_at", None)
+    return {
+        "id": message.id,
+        "channel_id": channel.id,
+        "channel": getattr(channel, "name", None),
+        "guild_id": getattr(getattr(channel, "guild", None), "id", None),
+        "author_id": message.author.id,
+        "author": getattr(message.author, "name", None),
+        "created_at": message.created_at.isoformat(),
+        "edited_at": edited_at.isoformat() if edited_at else None,
+        "content": message.content,
+        "pinned": message.pinned,
+        "embeds": [embed.to_dict() for embed in getattr(message, "embeds", ())],
+        "reference": {
+            "message_id": reference.message_id,
+            "channel_id": reference.channel_id,
+            "guild_id": reference.guild_id,
+        } if reference else None,
+        "attachments": [
+            {"id": a.id, "filename": a.filename, "url": a.url, "size": a.size, "content_type": a.content_type}
+            for a in message.attachments if a is not None
+        ],
+        "attachment_count": len(message.attachments),
+        "from_index": isinstance(message, IndexedMessage),
+    }
+
+
+class MessageArchive:
+    """
+    Optional copy of everything a purge or watcher is about to delete.
+
+    `add()` runs on the event loop and only serialises the message into a
+    bounded queue. A writer thread turns records into JSONL, compresses them
+    (zstd if `zstandard` is installed, else gzip) and writes about 1 MB at a
+    time, with a flush and fsync every few seconds. Attachments go to a
+    separate bounded queue drained by a few download tasks sharing one HTTP
+    session. When either queue is full the item is dropped and counted, so
+    deletions never wait on the archive.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.path = None
+        self.files_dir = None
+        self.compression = None
+        self.written = 0
+        self.dropped = 0
+        self.files_saved = 0
+        self.files_failed = 0
+        self.files_skipped = 0
+        self._records = None
+        self._writer = None
+        self._downloads = None
+        self._downloaders = []
+        self._session = None
+
+    def _open(self, compression):
+        raw = open(self.path, "wb")
+        if compression == "zstd":
+            import zstandard
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+            return raw, stream, lambda: stream.flush(zstandard.FLUSH_BLOCK)
+        import gzip
+        stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+        return raw, stream, stream.flush # GzipFile.flush is a Z_SYNC_FLUSH
+
+    def start(self, files=False, compression="zstd"):
+        """Opens a new archive file. Returns the compression actually used."""
+        if compression == "zstd":
+            try:
+                import zstandard # noqa: F401
+            except ImportError:
+                compression = "gzip"
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(ARCHIVE_DIR, f"purge-{stamp}.jsonl.{'zst' if compression == 'zstd' else 'gz'}")
+        self.compression = compression
+        self.written = self.dropped = 0
+        self.files_saved = self.files_failed = self.files_skipped = 0
+        self._records = queue.Queue(maxsize=ARCHIVE_BUFFER)
+        self._writer = threading.Thread(target=self._write_loop, args=self._open(compression), name="purger-archive", daemon=True)
+        self._writer.start()
+
+        self.files_dir = None
+        if files:
+            self.files_dir = os.path.join(ARCHIVE_DIR, f"purge-{stamp}-files")
+            os.makedirs(self.files_dir, exist_ok=True)
+            self._downloads = asyncio.Queue(maxsize=ARCHIVE_DOWNLOAD_QUEUE)
+            self._downloaders = [asyncio.create_task(self._download_loop()) for _ in range(ARCHIVE_DOWNLOADERS)]
+        self.active = True
+        return compression
+
+    def add(self, message):
+        try:
+            record = archive_record(message)
+        except Exception as e:
+            logger.warning(f"Could not archive message {message.id}: {e!r}")
+            return
+        try:
+            self._records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Archive buffer full, {self.dropped} message(s) not archived so far")
+        if self.files_dir:
+            for attachment in record["attachments"]:
+                try:
+                    self._downloads.put_nowait((message.id, attachment))
+                except asyncio.QueueFull:
+                    self.files_skipped += 1
+
+    def _write_loop(self, raw, stream, sync):
+        buffer = bytearray()
+        last_sync = time.monotonic()
+        try:
+            while True:
+                try:
+                    record = self._records.get(timeout=ARCHIVE_FSYNC_INTERVAL)
+                except queue.Empty:
+                    record = None
+                if record is _ARCHIVE_STOP:
+                    break
+                if record is not None:
+                    buffer += json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                    buffer += b"\n"
+                    self.written += 1
+                if len(buffer) >= ARCHIVE_CHUNK_BYTES:
+                    stream.write(buffer)
+                    buffer.clear()
+                if time.monotonic() - last_sync >= ARCHIVE_FSYNC_INTERVAL:
+                    if buffer:
+                        stream.write(buffer)
+                        buffer.clear()
+                    sync()
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                    last_sync = time.monotonic()
+            stream.write(buffer)
+        finally:
+            stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+            raw.close()
+
+    async def _download_loop(self):
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=ARCHIVE_DOWNLOADERS))
+        while True:
+            item = await self._downloads.get()
+            if item is None:
+                return
+            message_id, attachment = item
+            name = re.sub(r"[^\w.-]", "_", attachment["filename"])[-100:]
+            path = os.path.join(self.files_dir, f"{message_id}_{attachment['id']}_{name}")
+            try:
+                async with self._session.get(attachment["url"]) as response:
+                    response.raise_for_status()
+                    f = await asyncio.to_thread(open, path, "wb")
+                    try:
+                        async for chunk in response.content.iter_chunked(1 << 20):
+                            await asyncio.to_thread(f.write, chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+                self.files_saved += 1
+            except Exception as e:
+                self.files_failed += 1
+                logger.warning(f"Attachment download failed for message {message_id}: {e!r}")
+
+    async def stop(self):
+        """Waits for pending attachments, then flushes and closes the archive file."""
+        if not self.active:
+            return
+        self.active = False
+        if self._downloaders:
+            for _ in self._downloaders:
+                await self._downloads.put(None)
+            await asyncio.gather(*self._downloaders)
+            self._downloaders = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await asyncio.to_thread(self._records.put, _ARCHIVE_STOP)
+        await asyncio.to_thread(self._writer.join)
+
+    def close_at_exit(self):
+        # Interpreter exit without `.archive off`: keep what is buffered
+        if self.active and self._writer.is_alive():
+            self.active = False
+            self._records.put(_ARCHIVE_STOP)
+            self._writer.join(timeout=10)
+
+    def status(self):
+        text = f"{self.written} message(s) written, {self.dropped} dropped"
+        if self.files_dir:
+            pending = self._downloads.qsize() if self.active else 0
+            text += f" | files: {self.files_saved} saved, {self.files_failed} failed, {self.files_skipped} skipped, {pending} pending"
+        return text
+
+
+archive = MessageArchive()
+atexit.register(archive.close_at_exit)
+
+
+# --- Scan/delete pipeline ---
+
+PURGE_QUEUE_SIZE = 500 # Max matched messages waiting for deletion (caps memory)
+
+active_pipelines = set()
+
+
+class PurgePipeline:
+    """
+    Producer/consumer purge. One task pages through history and runs the
+    filter, pushing matches into a bounded queue; a worker drains the queue
+    through the DeleteScheduler. History fetches and delete pacing overlap
+    instead of adding up, and a full queue pauses the scan.
+    """
+
+    def __init__(self, history_iterator, filter_func, can_manage, scanned_limit=None, queue_size=PURGE_QUEUE_SIZE, checkpoint=None, verbose=True):
+        self.verbose = verbose # Per-message console lines (off under a live progress table)
+        self.history_iterator = history_iterator
+        self.filter_func = filter_func
+        self.classifier = getattr(filter_func, "classifier", None) # Content rules that may run in the process pool
+        self.can_manage = can_manage
+        self.scanned_limit = scanned_limit
+        self.checkpoint = checkpoint
+        self.job = current_job.get() # Cancel/pause state and counters of the job running this purge
+        if self.job:
+            self.job.pipelines.append(self)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.peak_depth = 0
+        self.scan_done_at = None
+        self.started_at = None
+        self.completed = False
+        self._last_scanned_id = None
+        self._pending_ids = deque() # Matched but not yet processed, newest first
+        self._base_scanned = 0
+        self._base_deleted = 0
+
+    @property
+    def cancelled(self):
+        return self.job is not None and self.job.cancelled
+
+    async def _wait_if_paused(self):
+        if self.job is not None and self.job.paused:
+            await self.job.wait_resumed()
+
+    def _elapsed(self, until=None):
+        return max((until or asyncio.get_running_loop().time()) - self.started_at, 1e-9)
+
+    @property
+    def scan_rate(self):
+        return self.scanned / self._elapsed(self.scan_done_at)
+
+    @property
+    def delete_rate(self):
+        return self.deleted / self._elapsed()
+
+    def progress(self):
+        return (
+            f"📡 Scanned {self.scanned} ({self.scan_rate:.0f}/s) | "
+            f"queued {self.queue.qsize()} | deleted {self.deleted} ({self.delete_rate:.2f}/s)"
+        )
+
+    def _candidate(self, message):
+        # Whitelist protection (ids, authors, ranges, pinned)
+        if protection.protects(message):
+            return False
+        # Logic: If no admin perms, we ONLY delete OUR messages, even if filter_func matches.
+        # If we have admin perms, we follow the filter_func exactly.
+        return self.can_manage or message.author.id == bot.user.id
+
+    async def _process(self, page):
+        """Runs the filter over a page of scanned messages and queues the matches."""
+        if self.classifier and len(page) > 1:
+            await self.classifier.classify([message for message in page if self._candidate(message)])
+        for message in page:
+            self.scanned += 1
+            metrics.inc("messages_scanned_total")
+            if self.checkpoint and self._last_scanned_id and message.id > self._last_scanned_id:
+                # The source went back up (search fallback re-reading below the head scan): in order again
+                self.checkpoint.search_floor = None
+            self._last_scanned_id = message.id
+
+            if self.scanned % 100 == 0:
+                if self.verbose:
+                    console.print(f"[blue]{self.progress()}[/blue]", end="\r")
+                self.save_checkpoint()
+
+            if self._candidate(message) and self.filter_func(message):
+                self.matched += 1
+                metrics.inc("messages_matched_total")
+                if archive.active:
+                    archive.add(message)
+                self._pending_ids.append(message.id)
+                await self.queue.put(message)
+                self.peak_depth = max(self.peak_depth, self.queue.qsize())
+
+    async def _scan(self):
+        # With content rules, messages are filtered a page at a time so the page can be classified in one batch
+        page_size = CLASSIFY_PAGE if self.classifier else 1
+        page = []
+        read = 0
+        in_flight = None # Previous page, classified in the pool while the next one is fetched
+        try:
+            async for message in self.history_iterator:
+                await self._wait_if_paused()
+                if self.cancelled:
+                    if self.verbose:
+                        console.print("[bold yellow]🛑 Purge operation cancelled by user.[/bold yellow]")
+                    break
+
+                # Stop if we hit the limit
+                if self.scanned_limit and read >= self.scanned_limit:
+                    break
+                read += 1
+                page.append(message)
+                if len(page) < page_size:
+                    continue
+                if self.classifier:
+                    if in_flight:
+                        await in_flight
+                    in_flight = asyncio.create_task(self._process(page))
+                else:
+                    await self._process(page)
+                page = []
+            if in_flight:
+                await in_flight
+            if page and not self.cancelled:
+                await self._process(page)
+            # Reaching the end of history or the scan limit both count as done
+            self.completed = not self.cancelled
+        finally:
+            if in_flight and not in_flight.done():
+                in_flight.cancel() # Only on errors; the normal path awaited it
+            # Close the iterator now so index snapshots are saved deterministically
+            aclose = getattr(self.history_iterator, "aclose", None)
+            if aclose:
+                await aclose()
+            self.scan_done_at = asyncio.get_running_loop().time()
+            await self.queue.put(None) # Tell the worker there is nothing more
+
+    def _bulk_eligible(self, message):
+        # Bulk delete needs Manage Messages and only accepts messages younger than 14 days
+        if not (self.can_manage and delete_scheduler.bulk_supported):
+            return False
+        return discord.utils.utcnow() - message.created_at < BULK_DELETE_MAX_AGE
+
+    async def _drain(self):
+        batch = [] # Recent messages waiting for one bulk-delete call
+        while True:
+            # Send the batch when it is full or the scanner has nothing more ready right now
+            if batch and (len(batch) >= BULK_DELETE_MAX or self.queue.empty()):
+                await self._delete_batch(batch)
+            message = await self.queue.get()
+            if message is None:
+                break
+            await self._wait_if_paused()
+            if self.cancelled:
+                continue # Keep draining so the scanner never blocks on a full queue
+
+            if self._bulk_eligible(message):
+                batch.append(message)
+                continue
+            if batch:
+                await self._delete_batch(batch) # Keep history order so the checkpoint cursor stays valid
+            await self._delete_one(message)
+
+        if batch and not self.cancelled:
+            await self._delete_batch(batch)
+
+    async def _delete_one(self, message):
+        # The whitelist may have changed since the message was queued
+        deleted = not protection.protects(message) and await delete_scheduler.delete(message)
+        self._pending_ids.popleft()
+        if deleted:
+            self._record_delete(message)
+
+    async def _delete_batch(self, batch):
+        messages = [message for message in batch if not protection.protects(message)]
+        if len(messages) > 1 and await delete_scheduler.delete_bulk(messages[0].channel, messages):
+            for _ in batch:
+                self._pending_ids.popleft()
+            for message in messages:
+                self._record_delete(message)
+        else:
+            for message in batch:
+                await self._delete_one(message)
+        batch.clear()
+
+    def _record_delete(self, message):
+        self.deleted += 1
+        message_index.evict((message.id,))
+        if self.verbose:
+            chan_name = getattr(message.channel, "name", None) or "DM"
+            activity_log.add("DELETE", chan_name, f"[cyan]#{self.deleted}[/cyan] [dim]|[/dim] [green]#{chan_name}[/green]", message.content)
+
+    def save_checkpoint(self, force=False):
+        """Moves the checkpoint cursor to the oldest message with nothing pending above it."""
+        checkpoint = self.checkpoint
+        if checkpoint is None:
+            return
+        cursor = self._last_scanned_id
+        if self._pending_ids:
+            # Normally pending[0] is the newest; after a search fallback, older search hits can still sit in front
+            cursor = max(cursor or 0, max(self._pending_ids) + 1) # `before=` is exclusive
+        if cursor and checkpoint.search_floor:
+            cursor = max(cursor, checkpoint.search_floor)
+        if cursor:
+            checkpoint.cursor_id = cursor
+        checkpoint.scanned = self._base_scanned + self.scanned
+        checkpoint.deleted = self._base_deleted + self.deleted
+        checkpoint.updated_at = time.time()
+        checkpoints.update(force=force)
+
+    async def run(self):
+        self.started_at = asyncio.get_running_loop().time()
+        if self.checkpoint:
+            self._base_scanned = self.checkpoint.scanned
+            self._base_deleted = self.checkpoint.deleted
+        active_pipelines.add(self)
+        scan_task = asyncio.create_task(self._scan())
+        try:
+            await self._drain()
+            await scan_task
+        finally:
+            scan_task.cancel()
+            active_pipelines.discard(self)
+            message_index.flush()
+            if self.checkpoint:
+                if self.completed and not self.cancelled:
+                    checkpoints.discard(self.checkpoint.channel_id)
+                else:
+                    self.save_checkpoint(force=True)
+        return self.scanned, self.deleted
+
+def current_rss_mb():
+    """Resident memory of this process in MB, or None where it cannot be read cheaply."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Peak, not current
+        return peak / (1048576 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        return None # Windows
+
+
+def draw_welcome():
+    """Banner and command table. Runs in a worker thread so on_ready never blocks the loop."""
+    from rich.table import Table
+    draw_banner()
+    
+    table = Table(title="Advanced Commands", show_header=True, header_style="bold cyan")
+    table.add_column("Command", style="magenta", no_wrap=True)
+    table.add_column("Usage", style="green")
+    table.add_column("Description", style="white")
+    
+    table.add_row(".purge", ".purge <expr> [limit:N]", "Filter expression: author: word: re: has: before: after: pinned, AND/OR/NOT")
+    table.add_row(".estimate", ".estimate <expr> [limit:N]", "Dry run: expected scan, deletes and time (or .purge ... --dry-run)")
+    table.add_row(".purge_user", ".purge_user <@User/everyone> [limit]", "Delete user or everyone's messages")
+    table.add_row(".purge_word", ".purge_word <word> [limit]", "Delete messages with word (0=full)")
+    table.add_row(".purge_media", ".purge_media [limit]", "Delete messages with attachments")
+    table.add_row(".purge_links", ".purge_links [limit]", "Delete messages with links")
+    table.add_row(".purge_since", ".purge_since <YYYY-MM-DD> [limit]", "Delete messages after date")
+    table.add_row(".purge_range", ".purge_range <from> <to> [filter]", "Delete messages in a date/id window")
+    table.add_row(".watch_user", ".watch_user @User", "Toggle user monitoring")
+    table.add_row(".watch_word", ".watch_word <word|word:x|re:x>", "Add/remove word from monitoring")
+    table.add_row(".watch_stats", ".watch_stats", "Auto-delete queue depth, drops and latency")
+    table.add_row(".stats", ".stats", "Counters, request latency p50/p95/p99, loop lag")
+    table.add_row(".whitelist", ".whitelist <add/add-range/add-author/pinned/import/export/list/clear>", "Manage protected messages (persistent)")
+    table.add_row(".index", ".index <stats/clear/clear_all>", "Inspect or reset the local message index")
+    table.add_row(".speed", ".speed <safe/fast/insane>", "Set the deletion pacing policy")
+    table.add_row(".log", ".log <verbose/summary/quiet>", "Per-delete output: lines, coalesced, or none")
+    table.add_row(".profile", ".profile <on [mem]/off/dump>", "Profile the next purge or a watch window")
+    table.add_row(".archive", ".archive <on [files]/off>", "Save a compressed copy of messages before deleting")
+    table.add_row(".multipurge", ".multipurge #c1[:limit][:filter] #c2", "Purge channels + threads concurrently")
+    table.add_row(".purge_guild", ".purge_guild [filter] [guild_id]", "Purge a server, skipping channels with no matches")
+    table.add_row(".jobs", ".jobs [priority <id> <high/normal/low>]", "List queued and running purge jobs")
+    table.add_row(".cancel", ".cancel <job id>", "Cancel one purge job")
+    table.add_row(".pause", ".pause <job id>", "Pause or continue a purge job")
+    table.add_row(".stop", ".stop", "Cancel every queued and running purge job")
+    table.add_row(".resume", ".resume [list/channel_id]", "Continue a stopped or interrupted purge")
+    table.add_row(".shutdown", ".shutdown", "Gracefully stop the bot")
+    
+    console.print(table)
+    console.print(f"[bold green]Selfbot logged in as {bot.user}[/bold green]\n")
+
+
+@bot.event
+async def on_ready():
+    rss = current_rss_mb()
+    logger.info(
+        f"Selfbot logged in as {bot.user} | ready in {time.monotonic() - STARTED_AT:.1f}s | "
+        f"{len(bot.guilds)} guilds | RSS {f'{rss:.0f} MB' if rss else 'n/a'} | profile {STARTUP_PROFILE} | runtime {runtime_description}"
+    )
+    await metrics.start()
+    await jobs.start_control()
+    await asyncio.to_thread(protection.load)
+    await asyncio.to_thread(draw_welcome)
+    
+
+# --- Multi-channel engine ---
+
+MULTIPURGE_CONCURRENCY = 4 # Channels scanned at the same time
+MULTIPURGE_DEFAULT_LIMIT = 1000
+
+
+def can_manage_messages(channel):
+    guild = getattr(channel, "guild", None)
+    if guild is None:
+        return False # DMs: only our own messages can be deleted
+    permissions = channel.permissions_for(guild.me)
+    return permissions.manage_messages or permissions.administrator
+
+
+class ChannelTarget:
+    def __init__(self, channel, limit, spec, parent=None):
+        self.channel = channel
+        self.limit = limit
+        self.spec = spec
+        self.parent = parent
+        self.pipeline = None
+        self.status = "waiting"
+
+    @property
+    def label(self):
+        name = getattr(self.channel, "name", None) or f"DM ({getattr(self.channel, 'recipient', '?')})"
+        return f"  └ {name}" if self.parent else f"#{name}"
+
+
+class MultiChannelPurge:
+    """
+    Runs one PurgePipeline per channel (threads and forum posts included)
+    with at most `concurrency` scanning at once. All deletes go through the
+    shared DeleteScheduler, which keeps each channel inside its own bucket
+    and the combined rate under the policy cap. Progress is shown as a live
+    table instead of per-message lines.
+    """
+
+    def __init__(self, targets, concurrency=MULTIPURGE_CONCURRENCY):
+        self.targets = targets
+        self.concurrency = concurrency
+
+    @staticmethod
+    async def expand(channel, limit, spec):
+        """The channel itself (unless it is a forum) plus its active and archived threads."""
+        targets = []
+        if not isinstance(channel, discord.ForumChannel):
+            targets.append(ChannelTarget(channel, limit, spec))
+        if not isinstance(channel, (discord.TextChannel, discord.ForumChannel)):
+            return targets
+
+        threads = {thread.id: thread for thread in channel.threads}
+        archived = [channel.archived_threads(limit=None)]
+        if isinstance(channel, discord.TextChannel) and channel.permissions_for(channel.guild.me).manage_threads:
+            archived.append(channel.archived_threads(limit=None, private=True)) # Private archives need Manage Threads
+        for iterator in archived:
+            try:
+                async for thread in iterator:
+                    threads.setdefault(thread.id, thread)
+            except discord.HTTPException:
+                pass
+        targets.extend(ChannelTarget(thread, limit, spec, parent=channel) for thread in threads.values())
+        return targets
+
+    async def _run_target(self, target, semaphore):
+        async with semaphore:
+            job = current_job.get()
+            if job and job.paused:
+                await job.wait_resumed()
+            if job_cancelled():
+                target.status = "cancelled"
+                return
+            target.status = "scanning"
+            checkpoint = checkpoints.start(target.channel.id, target.spec, limit=target.limit)
+            target.pipeline = PurgePipeline(
+                search_history(target.channel, target.spec, limit=target.limit, checkpoint=checkpoint),
+                build_filter(target.spec),
+                can_manage_messages(target.channel),
+                checkpoint=checkpoint,
+                verbose=False,
+            )
+            try:
+                await target.pipeline.run()
+                target.status = "cancelled" if job_cancelled() else "done"
+            except discord.HTTPException as e:
+                target.status = f"error {e.status}"
+            except Exception as e:
+                target.status = f"error: {escape(str(e))}"
+
+    def render(self):
+        from rich.table import Table
+        table = Table(title="Multi-channel purge", header_style="bold cyan")
+        for column in ("Channel", "Filter", "Scanned", "Matched", "Deleted", "Queue", "Del/s", "Status"):
+            table.add_column(column, justify="left" if column in ("Channel", "Filter", "Status") else "right")
+
+        totals = [0, 0, 0, 0]
+        for target in self.targets:
+            pipeline = target.pipeline
+            if pipeline:
+                numbers = [pipeline.scanned, pipeline.matched, pipeline.deleted, pipeline.queue.qsize()]
+                rate = f"{pipeline.delete_rate:.2f}"
+                totals = [a + b for a, b in zip(totals, numbers)]
+            else:
+                numbers, rate = ["-"] * 4, "-"
+            table.add_row(target.label, describe_spec(target.spec), *map(str, numbers), rate, target.status)
+
+        table.add_section()
+        table.add_row("[bold]Total[/bold]", "", *map(str, totals), f"{delete_scheduler.policy.name}", f"429s: {delete_scheduler.rate_limit_count()}")
+        return table
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.create_task(self._run_target(target, semaphore)) for target in self.targets]
+        from rich.live import Live
+        with Live(self.render(), console=console, refresh_per_second=2) as live:
+            pending = set(tasks)
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=0.5)
+                live.update(self.render())
+        return sum(target.pipeline.deleted for target in self.targets if target.pipeline)
+
+
+
+# --- Guild purge planner ---
+
+PLAN_GUILD_SEARCH_MAX = 500 # Guild-wide hits paged through before falling back to per-channel probes
+PLAN_PROBE_CONCURRENCY = 2 # Search is rate-limited harder than history
+PLAN_RECENT_WINDOW = timedelta(minutes=15) # Search lags behind live chat; such channels get a head scan
+
+
+@dataclass
+class ChannelProbe:
+    target: ChannelTarget
+    estimate: int = None # Matching messages (None = unknown)
+    source: str = "unknown" # guild search, search, index, empty, recent, no access, indexing, unknown
+
+
+class GuildPurgePlanner:
+    """
+    Decides which channels of a guild a purge has to scan. Every text, voice
+    and forum channel we can read is listed along with its threads, and each
+    one is probed cheaply before any history is paged:
+
+    1. One guild-wide search. If it lists every hit (at most
+       PLAN_GUILD_SEARCH_MAX), it gives exact per-channel counts, archived
+       threads included, and nothing else needs probing.
+    2. Otherwise per channel: no messages at all, the local index (if it
+       covers the channel up to its last message), or a one-page search for
+       the channel's total.
+
+    Channels with nothing to delete are dropped. The rest are ordered by
+    expected yield, unknown ones last.
+    """
+
+    def __init__(self, guild, spec):
+        self.guild = guild
+        self.spec = spec
+        self.requests = 0
+        self.probes = []
+
+    def _spec_for(self, can_manage):
+        # Without Manage Messages only our own messages can go, so "everything" narrows to "own"
+        if not can_manage and (self.spec["kind"] == "all" or self.spec.get("user_id") == "everyone"):
+            return {"kind": "own"}
+        return self.spec
+
+    def _search_params(self, can_manage):
+        """Search filters for what a purge could delete here, or None if search cannot narrow it."""
+        spec = self._spec_for(can_manage)
+        params = search_params(spec)
+        if params is None or can_manage or spec["kind"] == "own":
+            return params
+        authors = params.get("authors")
+        if authors and all(author.id != bot.user.id for author in authors):
+            return {} # Someone else's messages without Manage Messages: nothing to delete
+        return {**params, "authors": [bot.user]}
+
+    def _readable(self, channel):
+        permissions = channel.permissions_for(self.guild.me)
+        return permissions.read_messages and permissions.read_message_history
+
+    async def _list_targets(self, archived):
+        channels = [c for c in self.guild.channels if isinstance(c, (discord.TextChannel, discord.VoiceChannel, discord.ForumChannel)) and self._readable(c)]
+        targets = []
+        if archived:
+            semaphore = asyncio.Semaphore(MULTIPURGE_CONCURRENCY)
+            async def expand(channel):
+                async with semaphore:
+                    return await MultiChannelPurge.expand(channel, None, self.spec)
+            for expanded in await asyncio.gather(*(expand(c) for c in channels)):
+                targets.extend(expanded)
+            return targets
+        for channel in channels:
+            if not isinstance(channel, discord.ForumChannel):
+                targets.append(ChannelTarget(channel, None, self.spec))
+            targets.extend(ChannelTarget(thread, None, self.spec, parent=channel) for thread in getattr(channel, "threads", ()))
+        return targets
+
+    async def _guild_search(self, params):
+        """Per-channel hit counts if one guild-wide search covers every hit, else None."""
+        counts = Counter()
+        channels = {}
+        seen = 0
+        total = None
+        try:
+            async for message in self.guild.search(limit=PLAN_GUILD_SEARCH_MAX, include_nsfw=True, **params):
+                if total is None:
+                    total = message.total_results or 0
+                    if message.doing_deep_historical_index or total > PLAN_GUILD_SEARCH_MAX:
+                        return None
+                seen += 1
+                counts[message.channel.id] += 1
+                channels.setdefault(message.channel.id, message.channel)
+        except (discord.HTTPException, ValueError) as e:
+            logger.info(f"Guild search unavailable in {self.guild.name} ({e}), probing channels one by one")
+            return None
+        finally:
+            self.requests += max(1, -(-seen // 25)) # 25 hits per search page
+        if total is not None and seen < total:
+            return None
+        return counts, channels
+
+    async def _probe(self, target, semaphore):
+        channel = target.channel
+        can_manage = can_manage_messages(channel)
+        target.spec = self._spec_for(can_manage)
+        params = self._search_params(can_manage)
+        if params == {}:
+            return ChannelProbe(target, 0, "no access")
+        if channel.last_message_id is None or getattr(channel, "message_count", None) == 0:
+            return ChannelProbe(target, 0, "empty")
+
+        filter_func = build_filter(target.spec)
+        predicate = filter_func if can_manage else lambda m: m.author.id == bot.user.id and filter_func(m)
+        count = message_index.count_matching(channel, predicate)
+        if count is not None:
+            return ChannelProbe(target, count, "index")
+        if params is None:
+            return ChannelProbe(target)
+
+        async with semaphore:
+            self.requests += 1
+            try:
+                async for message in channel.search(limit=1, **params):
+                    if message.doing_deep_historical_index:
+                        return ChannelProbe(target, None, "indexing")
+                    return ChannelProbe(target, message.total_results or 0, "search")
+            except (discord.HTTPException, ValueError):
+                return ChannelProbe(target)
+        return ChannelProbe(target, 0, "search")
+
+    def _recent(self, channel):
+        last_id = channel.last_message_id or 0
+        return discord.utils.snowflake_time(last_id) > discord.utils.utcnow() - PLAN_RECENT_WINDOW
+
+    async def plan(self):
+        """Probes the guild and returns the targets worth scanning, best first."""
+        guild_can_manage = self.guild.me.guild_permissions.manage_messages or self.guild.me.guild_permissions.administrator
+        guild_params = self._search_params(guild_can_manage)
+        found = await self._guild_search(guild_params) if guild_params else None
+
+        targets = await self._list_targets(archived=found is None)
+        if found is not None:
+            counts, channels = found
+            listed = {target.channel.id for target in targets}
+            for channel_id, channel in channels.items():
+                if channel_id not in listed and isinstance(channel, discord.Thread):
+                    targets.append(ChannelTarget(channel, None, self.spec, parent=channel.parent))
+
+        semaphore = asyncio.Semaphore(PLAN_PROBE_CONCURRENCY)
+        probes = []
+        pending = []
+        for target in targets:
+            if found is not None and can_manage_messages(target.channel) == guild_can_manage:
+                target.spec = self._spec_for(guild_can_manage)
+                probes.append(ChannelProbe(target, found[0][target.channel.id], "guild search"))
+            else:
+                pending.append(self._probe(target, semaphore))
+        probes.extend(await asyncio.gather(*pending))
+
+        for probe in probes:
+            # A zero from search may just mean the newest messages are not indexed yet
+            if probe.estimate == 0 and probe.source in ("guild search", "search") and self._recent(probe.target.channel):
+                probe.source = "recent"
+                probe.target.limit = SEARCH_HEAD_SCAN
+
+        self.probes = probes
+        keep = [p for p in probes if p.estimate != 0 or p.source == "recent"]
+        keep.sort(key=lambda p: (
+            0 if p.estimate else 1 if p.estimate is None else 2,
+            -(p.estimate or 0),
+            -(p.target.channel.last_message_id or 0),
+        ))
+        return keep
+
+    def render(self, keep):
+        from rich.table import Table
+        table = Table(title=f"Purge plan: {self.guild.name}", header_style="bold cyan")
+        table.add_column("Channel")
+        table.add_column("Expected", justify="right")
+        table.add_column("Probe")
+        for probe in keep:
+            expected = "?" if probe.estimate is None else f"≤{probe.target.limit} newest" if probe.source == "recent" else str(probe.estimate)
+            table.add_row(probe.target.label, expected, probe.source)
+        return table
+
+
+# --- Dry-run estimates (.estimate) ---
+
+ESTIMATE_SAMPLES = 10 # History pages sampled across the channel's id span
+ESTIMATE_EXACT_LIMIT = 1000 # Scan limits up to this are read in full instead of sampled
+ESTIMATE_PAGE_SECONDS = 0.35 # Assumed history page latency if no page could be timed
+SEARCH_PAGE_SIZE = 25 # Hits per search results page
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes:02d}m"
+    return f"{hours // 24}d {hours % 24}h"
+
+
+@dataclass
+class EstimateStratum:
+    low: int # Id range [low, high]
+    high: int
+    size: float = 0.0 # Messages estimated in the range
+    sampled: int = 0 # Messages read from the range
+    matched: int = 0
+    recent: int = 0 # Matches young enough for bulk delete
+    exact: bool = False # The sample covered the whole range
+
+
+class PurgeEstimator:
+    """
+    Dry run of a `.purge` expression in one channel. Nothing is deleted.
+
+    A channel fully indexed in purger_index.db is counted exactly from disk.
+    Otherwise two requests find the newest and oldest message inside the
+    expression's after:/before: bounds, that id span is cut into
+    ESTIMATE_SAMPLES equal strata, and one history page is read from the top
+    of each. A page's id spread gives the stratum's message density, and
+    the real filter gives its match rate. The strata are then summed newest
+    first up to the scan limit. That is at most ESTIMATE_SAMPLES + 2
+    requests, however many messages the channel holds. Limits up to
+    ESTIMATE_EXACT_LIMIT are just read in full.
+    """
+
+    def __init__(self, channel, expression, limit, can_manage):
+        self.channel = channel
+        self.expression = expression
+        self.compiled = compile_expression(expression)
+        self.limit = limit
+        self.can_manage = can_manage
+        self.requests = 0
+        self.page_times = []
+        self.source = "sample"
+        self.strata = []
+
+    def _selected(self, message):
+        """Would a real purge delete this message? Same checks as PurgePipeline."""
+        if protection.protects(message):
+            return False
+        if not (self.can_manage or message.author.id == bot.user.id):
+            return False
+        return self.compiled.predicate(message)
+
+    def _tally(self, stratum, messages):
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        for message in messages:
+            stratum.sampled += 1
+            if self._selected(message):
+                stratum.matched += 1
+                if message.created_at > cutoff:
+                    stratum.recent += 1
+
+    async def _page(self, **kwargs):
+        started = time.perf_counter()
+        self.requests += 1
+        messages = [message async for message in self.channel.history(**kwargs)]
+        self.page_times.append(time.perf_counter() - started)
+        return messages
+
+    def _bounds(self):
+        low = self.compiled.low_id or 0
+        high = (self.compiled.high_id or discord.utils.time_snowflake(discord.utils.utcnow(), high=True) + 1) - 1
+        return low, high
+
+    async def _from_index(self, low, high):
+        span = message_index.complete_span(self.channel)
+        if span is None:
+            return False
+        self.source = "index"
+        stratum = EstimateStratum(max(low, span[0]), min(high, span[1]), exact=True)
+        batch = []
+        for message in message_index.indexed_messages(self.channel, stratum.low, stratum.high):
+            if self.limit is not None and stratum.sampled + len(batch) >= self.limit:
+                break
+            batch.append(message)
+            if len(batch) >= MessageIndex.READ_CHUNK:
+                self._tally(stratum, batch)
+                batch = []
+                await asyncio.sleep(0) # Let the gateway breathe on huge channels
+        self._tally(stratum, batch)
+        stratum.size = stratum.sampled
+        self.strata = [stratum]
+        return True
+
+    async def _sample(self, stratum, semaphore):
+        async with semaphore:
+            page = await self._page(limit=100, before=discord.Object(id=stratum.high + 1))
+        inside = [message for message in page if message.id >= stratum.low]
+        self._tally(stratum, inside)
+        if len(inside) < len(page) or len(page) < 100:
+            stratum.exact = True # The page reached past the bottom of the range
+            stratum.size = len(inside)
+        else:
+            # 100 messages spread over [oldest on the page, high]; scale that density to the range
+            spread = stratum.high + 1 - page[-1].id
+            stratum.size = len(page) * (stratum.high + 1 - stratum.low) / spread
+
+    async def run(self):
+        low, high = self._bounds()
+        if await self._from_index(low, high):
+            return self.summary()
+
+        if self.limit is not None and self.limit <= ESTIMATE_EXACT_LIMIT:
+            self.source = "read"
+            stratum = EstimateStratum(low, high, exact=True)
+            page_count = -(-self.limit // 100)
+            started = time.perf_counter()
+            messages = [m async for m in self.channel.history(limit=self.limit, before=discord.Object(id=high + 1)) if m.id >= low]
+            self.requests += page_count
+            self.page_times.append((time.perf_counter() - started) / page_count)
+            self._tally(stratum, messages)
+            stratum.size = stratum.sampled
+            self.strata = [stratum]
+            return self.summary()
+
+        newest = await self._page(limit=1, before=discord.Object(id=high + 1))
+        # No after: bound -> let discord.py start from the oldest message rather than sending after=-1
+        after = discord.Object(id=low - 1) if low else None
+        oldest = await self._page(limit=1, after=after, oldest_first=True) if newest else []
+        if not newest or not oldest or newest[0].id < low or oldest[0].id > high:
+            self.strata = []
+            return self.summary()
+
+        top, bottom = newest[0].id, oldest[0].id
+        width = max(1, -(-(top - bottom + 1) // ESTIMATE_SAMPLES))
+        self.strata = []
+        upper = top
+        while upper >= bottom:
+            self.strata.append(EstimateStratum(max(bottom, upper - width + 1), upper))
+            upper -= width
+        semaphore = asyncio.Semaphore(PLAN_PROBE_CONCURRENCY)
+        await asyncio.gather(*(self._sample(stratum, semaphore) for stratum in self.strata))
+        return self.summary()
+
+    def summary(self):
+        """Extrapolates the strata (newest first) up to the scan limit."""
+        scanned = matched = recent = variance = 0.0
+        remaining = self.limit
+        for stratum in self.strata:
+            if remaining is not None and remaining <= 0:
+                break
+            share = 1.0 if remaining is None or stratum.size <= remaining else remaining / stratum.size
+            size = stratum.size * share
+            scanned += size
+            if remaining is not None:
+                remaining -= size
+            if not stratum.sampled:
+                continue
+            rate = stratum.matched / stratum.sampled
+            matched += size * rate
+            recent += size * stratum.recent / stratum.sampled
+            if not stratum.exact:
+                # Stratified-sampling variance of the match count, with the finite population correction
+                fpc = max(0.0, 1 - stratum.sampled / stratum.size)
+                variance += size * size * rate * (1 - rate) / stratum.sampled * fpc
+
+        policy = delete_scheduler.policy
+        measured = metrics.histograms.get(("delete_seconds", (("kind", "single"),)))
+        if measured and measured.count >= 20:
+            per_delete, pacing = measured.sum / measured.count, "measured this session"
+        else:
+            per_delete = max(policy.base_delay, 1 / policy.max_rate if policy.max_rate else 0.0)
+            pacing = "policy base delay"
+        bulk = recent if self.can_manage and delete_scheduler.bulk_supported else 0.0
+        delete_requests = (matched - bulk) + -(-bulk // BULK_DELETE_MAX)
+
+        # Same source as purge_expression: after: walks history pages, before: skips the index
+        compiled = self.compiled
+        search = search_params({"kind": "expr", "expr": self.expression}) if self.limit is None and compiled.low_id is None else None
+        if self.source == "index" and compiled.low_id is None and compiled.high_id is None:
+            pages, page_kind = 0, "index"
+        elif search:
+            pages, page_kind = 1 + -(-matched // SEARCH_PAGE_SIZE), "search"
+        else:
+            pages, page_kind = -(-scanned // 100), "history"
+        page_seconds = (sum(self.page_times) / len(self.page_times)) if self.page_times else ESTIMATE_PAGE_SECONDS
+        scan_seconds = pages * page_seconds
+        delete_seconds = delete_requests * per_delete
+        return {
+            "source": self.source,
+            "requests": self.requests,
+            "scanned": round(scanned),
+            "matched": round(matched),
+            "margin": round(1.96 * variance ** 0.5),
+            "bulk": round(bulk),
+            "pages": int(pages),
+            "page_kind": page_kind,
+            "page_seconds": page_seconds,
+            "per_delete": per_delete,
+            "pacing": pacing,
+            "policy": policy.name,
+            # Scanning and deleting overlap in the pipeline, so the slower of the two sets the pace
+            "seconds": max(scan_seconds, delete_seconds),
+        }
+
+
+# --- Purge jobs (.jobs / .cancel / .pause) ---
+
+JOB_CONCURRENCY = 2 # Jobs running at once; they split the delete budget, they don't add to it
+JOB_HISTORY = 20 # Finished jobs kept for .jobs and the control API
+JOB_PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+CONTROL_SOCKET = os.getenv("PURGER_CONTROL_SOCKET") # Serve the local control API on this Unix socket when set
+
+# The job whose task is running; tasks a job creates (pipelines, multi-channel workers) inherit it
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def job_cancelled():
+    job = current_job.get()
+    return job is not None and job.cancelled
+
+
+class PurgeJob:
+    """
+    One submitted purge. It has its own cancel and pause state, and its
+    counters are summed from the pipelines it starts. Pipelines find their
+    job through `current_job`.
+    """
+
+    def __init__(self, job_id, label, run, priority, channels=(), guilds=(), whole_guild=False):
+        self.id = job_id
+        self.label = label
+        self.run = run
+        self.priority = priority
+        self.channels = set(channels)
+        self.guilds = set(guilds)
+        self.whole_guild = whole_guild
+        self.status = "queued" # queued, running, done, cancelled, failed
+        self.cancelled = False
+        self.paused = False
+        self.error = None
+        self.pipelines = []
+        self.task = None # The running task; the loop only keeps a weak reference to it
+        self.totals = {"scanned": 0, "matched": 0, "deleted": 0}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self.resume() # A paused job has to wake up to wind down
+        if self.task and not any(pipeline in active_pipelines for pipeline in self.pipelines):
+            # Not inside a pipeline (planning, probing): nothing checks the flag, so stop the task itself
+            self.task.cancel()
+
+    def pause(self):
+        self.paused = True
+        self._resumed.clear()
+
+    def resume(self):
+        self.paused = False
+        self._resumed.set()
+
+    async def wait_resumed(self):
+        await self._resumed.wait()
+
+    def conflicts(self, other):
+        """Two jobs over the same channel would fight over its checkpoint and delete slot."""
+        if self.channels & other.channels:
+            return True
+        return (self.whole_guild or other.whole_guild) and bool(self.guilds & other.guilds)
+
+    def counters(self):
+        counters = dict(self.totals)
+        for pipeline in self.pipelines:
+            counters["scanned"] += pipeline.scanned
+            counters["matched"] += pipeline.matched
+            counters["deleted"] += pipeline.deleted
+        return counters
+
+    def finish(self):
+        # Keep the numbers, drop the pipelines (and the history iterators they hold)
+        self.totals = self.counters()
+        self.pipelines = []
+        self.finished_at = time.time()
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def state(self):
+        return "paused" if self.paused and self.status in ("queued", "running") else self.status
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "label": self.label,
+            "priority": next(name for name, value in JOB_PRIORITIES.items() if value == self.priority),
+            "status": self.state(),
+            "error": self.error,
+            "elapsed_s": round(self.elapsed(), 1),
+            **self.counters(),
+        }
+
+
+class JobScheduler:
+    """
+    Runs purge jobs in priority order, at most JOB_CONCURRENCY at a time.
+    Two jobs that touch the same channel never run together, and neither
+    do a guild purge and another job in that guild. Running jobs share the
+    one DeleteScheduler: each channel keeps its own bucket slot, and the
+    policy's max_rate caps the combined rate across jobs.
+    """
+
+    def __init__(self, concurrency=JOB_CONCURRENCY):
+        self.concurrency = concurrency
+        self.jobs = {} # id -> PurgeJob, oldest first
+        self._next_id = 1
+        self._server = None
+
+    def submit(self, label, run, priority="normal", channels=(), guilds=(), whole_guild=False):
+        """Queues `run` (a coroutine function) as a job and starts it if a slot is free."""
+        if priority not in JOB_PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r} (use {'/'.join(JOB_PRIORITIES)})")
+        job = PurgeJob(self._next_id, label, run, JOB_PRIORITIES[priority], channels, guilds, whole_guild)
+        self._next_id += 1
+        self.jobs[job.id] = job
+        self._dispatch()
+        return job
+
+    def running(self):
+        return [job for job in self.jobs.values() if job.status == "running"]
+
+    def queued(self):
+        return [job for job in self.jobs.values() if job.status == "queued"]
+
+    def _dispatch(self):
+        running = self.running()
+        for job in sorted(self.queued(), key=lambda job: (job.priority, job.id)):
+            if len(running) >= self.concurrency:
+                break
+            if job.paused or any(job.conflicts(other) for other in running):
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            job.task = asyncio.create_task(self._run(job))
+            job.task.add_done_callback(lambda _, job=job: setattr(job, "task", None))
+            running.append(job)
+
+    async def _run(self, job):
+        current_job.set(job) # This task's context only; every task the job creates copies it
+        try:
+            await job.run()
+            job.status = "cancelled" if job.cancelled else "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.exception(f"Job #{job.id} ({job.label}) failed")
+            console.print(f"[bold red]❌ Job #{job.id} failed: {escape(str(e))}[/bold red]")
+        finally:
+            job.finish()
+            self._prune()
+            self._dispatch()
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+        for job in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self.jobs[job.id]
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"No job #{job_id}")
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job.status == "queued":
+            job.cancelled = True
+            job.status = "cancelled"
+            job.finish()
+        elif job.status == "running":
+            job.cancel()
+        return job
+
+    def cancel_all(self):
+        return [self.cancel(job.id) for job in self.queued() + self.running()]
+
+    def toggle_pause(self, job_id):
+        job = self.get(job_id)
+        if job.status not in ("queued", "running"):
+            raise ValueError(f"Job #{job_id} is already {job.status}")
+        if job.paused:
+            job.resume()
+            self._dispatch()
+        else:
+            job.pause()
+        return job
+
+    def set_priority(self, job_id, priority):
+        if priority not in JOB_PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r} (use {'/'.join(JOB_PRIORITIES)})")
+        job = self.get(job_id)
+        job.priority = JOB_PRIORITIES[priority]
+        self._dispatch()
+        return job
+
+    def render(self):
+        from rich.table import Table
+        table = Table(title="Purge jobs", header_style="bold cyan")
+        for column in ("#", "Job", "Priority", "Status", "Scanned", "Matched", "Deleted", "Del/s", "Time"):
+            table.add_column(column, justify="left" if column in ("Job", "Priority", "Status") else "right")
+        for job in self.jobs.values():
+            info = job.to_dict()
+            elapsed = job.elapsed()
+            rate = f"{info['deleted'] / elapsed:.2f}" if elapsed else "-"
+            status = info["status"] + (f": {info['error']}" if info["error"] else "")
+            table.add_row(
+                str(job.id), escape(job.label), info["priority"], status,
+                str(info["scanned"]), str(info["matched"]), str(info["deleted"]), rate, f"{elapsed:.0f}s",
+            )
+        return table
+
+    # --- local control API ---
+
+    async def start_control(self):
+        """Serves the control API on PURGER_CONTROL_SOCKET when set. Idempotent."""
+        if not CONTROL_SOCKET or self._server is not None:
+            return
+        if not hasattr(asyncio, "start_unix_server"):
+            logger.warning("PURGER_CONTROL_SOCKET is set but Unix sockets are not available on this platform")
+            return
+        if os.path.exists(CONTROL_SOCKET):
+            os.unlink(CONTROL_SOCKET) # Left behind by a previous run
+        old_umask = os.umask(0o177) # Anyone who can connect can delete messages as us: owner only
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_control, path=CONTROL_SOCKET)
+        finally:
+            os.umask(old_umask)
+        logger.info(f"Job control API listening on {CONTROL_SOCKET}")
+
+    async def _handle_control(self, reader, writer):
+        """One JSON request per line, one JSON response per line."""
+        try:
+            while line := await reader.readline():
+                try:
+                    response = {"ok": True, **self.control(json.loads(line))}
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def control(self, request):
+        op = request.get("op")
+        if op == "jobs":
+            return {"jobs": [job.to_dict() for job in self.jobs.values()]}
+        if op == "submit":
+            return {"job": submit_control_job(request).to_dict()}
+        if op == "job":
+            job = self.get(int(request["id"]))
+        elif op == "cancel":
+            job = self.cancel(int(request["id"]))
+        elif op in ("pause", "resume"):
+            job = self.get(int(request["id"]))
+            if job.paused != (op == "pause"):
+                self.toggle_pause(job.id)
+        elif op == "priority":
+            job = self.set_priority(int(request["id"]), request["priority"])
+        else:
+            raise ValueError(f"Unknown op {op!r} (jobs, submit, job, cancel, pause, resume, priority)")
+        return {"job": job.to_dict()}
+
+
+jobs = JobScheduler()
+
+
+class ControlContext:
+    """The parts of a command Context that purges use, for jobs submitted through the control API."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.guild = getattr(channel, "guild", None)
+        self.author = self.guild.me if self.guild else bot.user
+
+
+def submit_channel_job(channel, label, run, priority="normal"):
+    guild = getattr(channel, "guild", None)
+    job = jobs.submit(label, run, priority, channels=(channel.id,), guilds=(guild.id,) if guild else ())
+    announce_job(job)
+    return job
+
+
+def announce_job(job):
+    if job.status == "queued":
+        console.print(f"[dim]🗂️ Job #{job.id} queued: {escape(job.label)} ({len(jobs.running())} running, see `.jobs`)[/dim]")
+    else:
+        console.print(f"[dim]🗂️ Job #{job.id} started: {escape(job.label)}[/dim]")
+
+
+def submit_control_job(request):
+    """
+    {"op": "submit", "channel": <id>, "expr": "<.purge expression>", "limit": N, "priority": "high"}
+    {"op": "submit", "guild": <id>, "filter": "own", "priority": "low"}
+    """
+    priority = request.get("priority", "normal")
+    if "guild" in request:
+        guild = bot.get_guild(int(request["guild"]))
+        if guild is None:
+            raise ValueError(f"Unknown guild {request['guild']}")
+        return submit_guild_purge(guild, spec_from_token(request.get("filter", "own")), priority)
+    channel = bot.get_channel(int(request["channel"]))
+    if channel is None:
+        raise ValueError(f"Unknown channel {request['channel']}")
+    limit = int(request.get("limit", 1000))
+    return submit_expression_purge(ControlContext(channel), request["expr"], limit or None, priority)
+
+
+# --- Watch-mode auto-delete ---
+
+WATCH_QUEUE_SIZE = 500 # Pending auto-deletes per channel
+WATCH_LATENCY_SAMPLES = 1000
+WATCH_IDLE_TIMEOUT = 60.0 # Seconds a channel's worker waits for more messages before its queue is dropped
+
+
+class AutoDeleter:
+    """
+    Per-channel queues for watch-mode deletes (`.watch_user`, `.watch_word`).
+
+    `on_message` only enqueues. One worker per channel drains its queue in
+    batches of up to 100 through the DeleteScheduler, as a single bulk-delete
+    call when we can manage messages there, so a raid cannot turn into a 429
+    storm or starve command handling.
+
+    Overflow policy: a channel queue holds at most WATCH_QUEUE_SIZE messages.
+    When it is full the OLDEST pending message is dropped (and counted), so
+    the deletes that do go out target what is currently on screen.
+
+    A failed batch is logged and counted and the worker moves on. A worker
+    that has had nothing to do for WATCH_IDLE_TIMEOUT exits and its queue is
+    removed, so a long watch session only keeps state for active channels.
+    """
+
+    def __init__(self, queue_size=WATCH_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.queues = {}  # channel id -> deque of (message, label, prefix, detected_at)
+        self.workers = {} # channel id -> running worker task
+        self._wakeups = {} # channel id -> Event set when an idle worker has new messages
+        self.latencies = deque(maxlen=WATCH_LATENCY_SAMPLES) # Detection -> delete, seconds
+        self.queued = 0
+        self.deleted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.peak_depth = 0
+
+    def submit(self, message, label, prefix):
+        if archive.active:
+            archive.add(message)
+        channel_id = message.channel.id
+        pending = self.queues.setdefault(channel_id, deque())
+        if len(pending) >= self.queue_size:
+            pending.popleft()
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Auto-delete queue full in {channel_id}, dropping oldest pending messages ({self.dropped} so far)")
+        pending.append((message, label, prefix, asyncio.get_running_loop().time()))
+        self.queued += 1
+        self.peak_depth = max(self.peak_depth, len(pending))
+        if channel_id in self.workers:
+            self._wakeups[channel_id].set()
+        else:
+            self._wakeups[channel_id] = asyncio.Event()
+            self.workers[channel_id] = asyncio.create_task(self._worker(channel_id))
+
+    async def _worker(self, channel_id):
+        pending = self.queues[channel_id]
+        wakeup = self._wakeups[channel_id]
+        try:
+            while True:
+                while pending:
+                    # Whatever piled up while the previous batch waited for its slot goes out together
+                    batch = [pending.popleft() for _ in range(min(len(pending), BULK_DELETE_MAX))]
+                    try:
+                        await self._delete_batch(batch)
+                    except Exception as e:
+                        self.errors += 1
+                        metrics.inc("auto_delete_errors_total")
+                        logger.warning(f"Auto-delete batch of {len(batch)} failed in {channel_id}: {e!r}")
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), WATCH_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    if not pending:
+                        break
+        finally:
+            del self.workers[channel_id]
+            del self._wakeups[channel_id]
+            if not pending:
+                del self.queues[channel_id]
+
+    async def _delete_batch(self, batch):
+        batch = [item for item in batch if not protection.protects(item[0])]
+        if not batch:
+            return
+        channel = batch[0][0].channel
+        messages = [item[0] for item in batch]
+        if (
+            len(messages) > 1
+            and delete_scheduler.bulk_supported
+            and can_manage_messages(channel)
+            and await delete_scheduler.delete_bulk(channel, messages)
+        ):
+            for item in batch:
+                self._record_delete(*item)
+            return
+        for item in batch:
+            if await delete_scheduler.delete(item[0]):
+                self._record_delete(*item)
+
+    def _record_delete(self, message, label, prefix, detected_at):
+        self.deleted += 1
+        latency = asyncio.get_running_loop().time() - detected_at
+        self.latencies.append(latency)
+        metrics.observe("auto_delete_reaction_seconds", latency)
+        chan_name = getattr(message.channel, "name", None) or "DM"
+        activity_log.add(label, chan_name, prefix, message.content)
+
+    def depth(self):
+        return sum(len(pending) for pending in self.queues.values())
+
+    def latency_percentiles(self):
+        """Detection-to-delete latency over the last WATCH_LATENCY_SAMPLES deletes, in ms."""
+        values = sorted(self.latencies)
+        if not values:
+            return {}
+        pick = lambda q: values[min(int(q * len(values)), len(values) - 1)] * 1000
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1] * 1000}
+
+
+auto_deleter = AutoDeleter()
+
+
+# --- High-throughput runtime (PURGER_RUNTIME=fast) ---
+
+RUNTIME_PROFILE = os.getenv("PURGER_RUNTIME", "default").lower()
+EVENT_FILTER_TTL = 60.0 # Seconds a channel's "may we delete other people's messages here" answer is reused
+
+runtime_description = "default"
+
+
+class MessageEventFilter:
+    """
+    Drops MESSAGE_CREATE payloads that on_message would ignore, before
+    discord.py builds a Message (author, member, embeds...) and schedules an
+    on_message task for them. A payload goes through if it is ours (commands),
+    or if a watcher wants it (`.watch_user` target or everyone, or a watched
+    word in the raw content) in a guild channel where we have Manage Messages.
+    Nobody else's message can be deleted anywhere else. Dropped payloads still
+    move the channel's last_message_id, which the planner and index rely on.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.passed = 0
+        self.dropped = 0
+        self._parse = None
+        self._self_id = None
+        self._manageable = {} # channel id -> (allowed, expires)
+
+    def install(self):
+        parsers = self.state.parsers # The same dict the gateway dispatches from
+        if self._parse is None:
+            self._parse = parsers["MESSAGE_CREATE"]
+            parsers["MESSAGE_CREATE"] = self.parse
+
+    def _can_delete_others(self, guild_id, channel_id):
+        now = time.monotonic()
+        cached = self._manageable.get(channel_id)
+        if cached and cached[1] > now:
+            return cached[0]
+        guild = self.state._get_guild(guild_id)
+        channel = guild and guild._resolve_channel(channel_id)
+        try:
+            allowed = channel is None or can_manage_messages(channel) # Unknown channel: let discord.py decide
+        except AttributeError:
+            allowed = True # guild.me not cached yet
+        self._manageable[channel_id] = (allowed, now + EVENT_FILTER_TTL)
+        return allowed
+
+    def wanted(self, data):
+        author_id = data["author"]["id"]
+        if self._self_id is None and self.state.self_id:
+            self._self_id = str(self.state.self_id)
+        if author_id == self._self_id:
+            return True # Our commands, and our own messages for .watch_word
+        target = target_user_id
+        if target != "everyone" and (target is None or author_id != str(target)):
+            if not (watched_words and watch_matcher.search(data.get("content") or "")):
+                return False
+        guild_id = data.get("guild_id")
+        if guild_id is None:
+            return False # DMs and group DMs: only our own messages can be deleted
+        return self._can_delete_others(int(guild_id), int(data["channel_id"]))
+
+    def parse(self, data):
+        if self.wanted(data):
+            self.passed += 1
+            self._parse(data)
+            return
+        self.dropped += 1
+        channel_id = int(data["channel_id"])
+        guild_id = data.get("guild_id")
+        if guild_id is None:
+            channel = self.state._get_private_channel(channel_id)
+        else:
+            guild = self.state._get_guild(int(guild_id))
+            channel = guild and guild._resolve_channel(channel_id)
+        if channel is not None:
+            channel.last_message_id = int(data["id"])
 
 
-# Selfbot configuration
-bot = commands.Bot(command_prefix=".", self_bot=True)
+message_filter = MessageEventFilter(bot._connection)
 
-# Global configuration state
-target_user_id = None
-watched_words = []
-whitelist_ids = set()
-deletion_delay = 2.2 # Default safe delay
-cancel_purge = False # Global flag for stopping ongoing operations
 
-URL_REGEX = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+def install_runtime():
+    """
+    Applies PURGER_RUNTIME=fast. Call it before the event loop starts, since
+    uvloop replaces the loop policy. Returns what is in effect, for the startup log.
+    """
+    global runtime_description
+    if RUNTIME_PROFILE != "fast":
+        return runtime_description
+    parts = []
+    try:
+        import uvloop
+    except ImportError:
+        parts.append("asyncio loop (pip install uvloop)")
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        parts.append("uvloop")
+    # discord.py decodes gateway and HTTP payloads with orjson whenever it is importable
+    parts.append("orjson" if discord.utils.HAS_ORJSON else "stdlib json (pip install orjson)")
+    parts.append(discord.utils._ActiveDecompressionContext.COMPRESSION_TYPE)
+    message_filter.install()
+    parts.append("early message drop")
+    runtime_description = "fast: " + ", ".join(parts)
+    return runtime_description
 
-@bot.event
-async def on_ready():
-    draw_banner()
-    
-    table = Table(title="Advanced Commands", show_header=True, header_style="bold cyan")
-    table.add_column("Command", style="magenta", no_wrap=True)
-    table.add_column("Usage", style="green")
-    table.add_column("Description", style="white")
-    
-    table.add_row(".purge_user", ".purge_user <@User/everyone> [limit]", "Delete user or everyone's messages")
-    table.add_row(".purge_word", ".purge_word <word> [limit]", "Delete messages with word (0=full)")
-    table.add_row(".purge_media", ".purge_media [limit]", "Delete messages with attachments")
-    table.add_row(".purge_links", ".purge_links [limit]", "Delete messages with links")
-    table.add_row(".purge_since", ".purge_since <YYYY-MM-DD>", "Delete messages after date")
-    table.add_row(".watch_user", ".watch_user @User", "Toggle user monitoring")
-    table.add_row(".watch_word", ".watch_word <word>", "Add/remove word from monitoring")
-    table.add_row(".whitelist", ".whitelist <add/list/clear>", "Manage protected messages")
-    table.add_row(".speed", ".speed <safe/fast/insane>", "Adjust deletion delay")
-    table.add_row(".multipurge", ".multipurge #c1 #c2", "Purge across multiple channels")
-    table.add_row(".stop", ".stop", "Cancel any ongoing purge operation")
-    table.add_row(".shutdown", ".shutdown", "Gracefully stop the bot")
-    
-    console.print(table)
-    console.print(f"[bold green]Selfbot logged in as {bot.user}[/bold green]\n")
-    logger.info(f"Selfbot logged in as {bot.user}")
-    
 
-async def smart_purge(ctx, history_iterator, scanned_limit=None, filter_func=None):
+async def smart_purge(ctx, history_iterator, scanned_limit=None, filter_func=None, checkpoint=None):
     """
     Unified purging logic with rate-limit handling, whitelist protection, 
-    dynamic delays, and permission auto-detection.
+    dynamic delays, and permission auto-detection. Scanning and deleting
+    run as a pipeline (see PurgePipeline); pass a checkpoint to make the
+    run resumable with `.resume`.
     """
-    global whitelist_ids, deletion_delay, cancel_purge
-    cancel_purge = False # Reset flag when a new purge starts
-    scanned_count = 0
-    deleted_count = 0
+    failed_before = delete_scheduler.failed
+    rate_limits_before = delete_scheduler.rate_limit_count()
+    bulk_before = delete_scheduler.bulk_requests
     
     # 🕵️ Permission Check: Can we delete other people's messages?
     permissions = ctx.channel.permissions_for(ctx.author)
@@ -126,99 +3620,88 @@ async def smart_purge(ctx, history_iterator, scanned_limit=None, filter_func=Non
     if not can_manage:
         console.print("[bold yellow]⚠️ No 'Manage Messages' permission! Switching to PERSONAL MODE (clearing only your own content).[/bold yellow]")
 
-    async for message in history_iterator:
-        if cancel_purge:
-            console.print("[bold yellow]🛑 Purge operation cancelled by user.[/bold yellow]")
-            break
-            
-        scanned_count += 1
-        
-        # Stop if we hit the limit
-        if scanned_limit and scanned_count > scanned_limit:
-            break
-            
-        if scanned_count % 100 == 0:
-            console.print(f"[blue]📡 Scanned {scanned_count} messages...[/blue]", end="\r")
-
-        # Whitelist protection
-        if message.id in whitelist_ids:
-            continue
+    pipeline = PurgePipeline(history_iterator, filter_func, can_manage, scanned_limit=scanned_limit, checkpoint=checkpoint)
+    scanned_count, deleted_count = await pipeline.run()
 
-        # Logic: If no admin perms, we ONLY delete OUR messages, even if filter_func matches.
-        # If we have admin perms, we follow the filter_func exactly.
-        is_own_message = message.author.id == bot.user.id
-        
-        if filter_func(message):
-            if can_manage or is_own_message:
-                try:
-                    await message.delete()
-                    deleted_count += 1
-                    
-                    # Truncate content for cleaner output (increased limit for readability)
-                    content = (message.content[:500] + '...') if len(message.content) > 500 else message.content
-                    content = content.replace("\n", " ") # Keep it on one line
-                    
-                    chan_name = message.channel.name if hasattr(message.channel, "name") else "DM"
-                    console.print(f"[bold red]🔥 [DELETE][/bold red] [cyan]#{deleted_count}[/cyan] [dim]|[/dim] [green]#{chan_name}[/green] [dim]|[/dim] [white]{content}[/white]")
-                    await asyncio.sleep(deletion_delay)
-                except discord.HTTPException as e:
-                    if e.status == 429:
-                        wait_time = e.retry_after + 2
-                        console.print(f"[bold yellow]⚠️ Rate limit hit! Waiting {wait_time:.2f}s...[/bold yellow]")
-                        await asyncio.sleep(wait_time)
-                        try: 
-                            await message.delete()
-                            deleted_count += 1
-                        except: pass
-                    else:
-                        console.print(f"[bold red]❌ API Error: {e}[/bold red]")
-                    
+    elapsed = pipeline._elapsed()
+    activity_log.flush() # Pending delete lines belong above the summary
+    console.print(
+        f"[dim]⏱️ scan {pipeline.scan_rate:.0f} msg/s | delete {pipeline.delete_rate:.2f}/s over {elapsed:.1f}s "
+        f"\\[{delete_scheduler.policy.name}] | peak queue {pipeline.peak_depth} | "
+        f"bulk calls: {delete_scheduler.bulk_requests - bulk_before} | "
+        f"429s: {delete_scheduler.rate_limit_count() - rate_limits_before} | "
+        f"failed: {delete_scheduler.failed - failed_before}[/dim]"
+    )
+    await profiler.purge_finished(f"purge in #{getattr(ctx.channel, 'name', None) or ctx.channel.id}")
     return scanned_count, deleted_count
 
+async def purge_expression(ctx, expr, limit=None):
+    """
+    One history pass for a filter expression; `.purge` and the purge_* aliases
+    all end up here. `after:`/`before:` bound the traversal itself, and other
+    top-level AND terms feed the search prefilter on full-history runs.
+    Raises ValueError for an invalid expression.
+    """
+    compiled = compile_expression(expr)
+    spec = {"kind": "expr", "expr": expr}
+    if compiled.low_id is not None:
+        checkpoint = checkpoints.start(ctx.channel.id, spec, limit=limit, after_id=compiled.low_id - 1)
+        checkpoint.cursor_id = compiled.high_id
+        source = range_history(ctx.channel, compiled.low_id, compiled.high_id)
+        scanned_limit = limit
+    else:
+        checkpoint = checkpoints.start(ctx.channel.id, spec, limit=limit)
+        checkpoint.cursor_id = compiled.high_id
+        before = discord.Object(id=compiled.high_id) if compiled.high_id else None
+        source = search_history(ctx.channel, spec, limit=limit, before=before, checkpoint=checkpoint)
+        scanned_limit = None # search_history applies the limit itself
+    return await smart_purge(ctx, source, scanned_limit=scanned_limit, filter_func=compiled.predicate, checkpoint=checkpoint)
+
 @bot.event
 async def on_message(message):
-    global target_user_id, watched_words, whitelist_ids
+    global target_user_id
     
     # Pre-check: Never auto-delete whitelisted messages
-    if message.id in whitelist_ids:
+    if protection.protects(message):
         await bot.process_commands(message)
         return
 
-    # 1. Auto-delete new messages from the targeted user
+    # 1. Auto-delete new messages from the targeted user (queued, see AutoDeleter)
     is_everyone = target_user_id == "everyone"
     is_target_user = target_user_id and message.author.id == target_user_id
     
     if (is_everyone or is_target_user) and message.author.id != bot.user.id:
-        try:
-            await message.delete()
-            mode_label = "EVERYONE" if is_everyone else "USER"
-            
-            # Truncate content for cleaner output
-            content = (message.content[:500] + '...') if len(message.content) > 500 else message.content
-            content = content.replace("\n", " ")
-            
-            console.print(f"[bold red]🔥 [AUTO-DELETE-{mode_label}][/bold red] [cyan]{message.author}[/cyan] [dim]|[/dim] [white]{content}[/white]")
-        except:
-            pass
-            
-    # 2. Auto-delete messages containing watched words
-    content_lower = message.content.lower()
-    for word in watched_words:
-        if word.lower() in content_lower:
-            try:
-                await message.delete()
-                
-                # Truncate content for cleaner output
-                disp_content = (message.content[:500] + '...') if len(message.content) > 500 else message.content
-                disp_content = disp_content.replace("\n", " ")
-                
-                console.print(f"[bold red]🔥 [WATCH-WORD][/bold red] '[yellow]{word}[/yellow]' [dim]|[/dim] [cyan]{message.author}[/cyan] [dim]|[/dim] [white]{disp_content}[/white]")
-                break # One deletion is enough
-            except:
-                pass
+        mode_label = "EVERYONE" if is_everyone else "USER"
+        auto_deleter.submit(message, f"AUTO-DELETE-{mode_label}", f"[cyan]{escape(str(message.author))}[/cyan]")
+    else:
+        # 2. Auto-delete messages containing watched words (single compiled scan)
+        word = watch_matcher.search(message.content)
+        if word:
+            auto_deleter.submit(message, "WATCH-WORD", f"'[yellow]{escape(word)}[/yellow]' [dim]|[/dim] [cyan]{escape(str(message.author))}[/cyan]")
 
     await bot.process_commands(message)
 
+@bot.event
+async def on_raw_message_delete(payload):
+    if message_index.tracks(payload.channel_id):
+        message_index.evict((payload.message_id,))
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    if message_index.tracks(payload.channel_id):
+        message_index.evict(payload.message_ids)
+
+@bot.event
+async def on_raw_message_edit(payload):
+    if not message_index.tracks(payload.channel_id):
+        return
+    content = payload.data.get("content")
+    if content is not None:
+        message_index.edit(payload.message_id, content)
+    pinned = payload.data.get("pinned")
+    if pinned is not None:
+        message_index.pin(payload.message_id, pinned)
+
 @bot.command(name="watch_user")
 async def watch_user(ctx, user_input: str = None):
     global target_user_id
@@ -282,6 +3765,143 @@ async def watch_word(ctx, word: str = None):
         watched_words.append(word)
         console.print(f"👀 Started monitoring word: {word}")
 
+    # Recompile once per change instead of re-checking every word per message
+    watch_matcher.rebuild(watched_words)
+
+@bot.command(name="watch_stats")
+async def watch_stats(ctx):
+    """Shows how the watch-mode auto-delete queues are keeping up."""
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    from rich.table import Table
+    latency = auto_deleter.latency_percentiles()
+    table = Table(title="Watch-mode auto-delete", show_header=True, header_style="bold cyan")
+    table.add_column("Metric", style="magenta")
+    table.add_column("Value", style="green")
+    table.add_row("Queued / deleted / dropped / failed", f"{auto_deleter.queued} / {auto_deleter.deleted} / {auto_deleter.dropped} / {auto_deleter.errors}")
+    table.add_row("Pending now (peak)", f"{auto_deleter.depth()} ({auto_deleter.peak_depth}) in {sum(1 for pending in auto_deleter.queues.values() if pending)} channel(s)")
+    table.add_row("Detect → delete p50 / p95 / p99", " / ".join(f"{latency[k]:.0f}ms" for k in ("p50", "p95", "p99")) if latency else "-")
+    table.add_row("Detect → delete max", f"{latency['max']:.0f}ms" if latency else "-")
+    table.add_row("Pacing", f"{delete_scheduler.policy.name} | 429s: {delete_scheduler.rate_limit_count()}")
+    console.print(table)
+
+@bot.command(name="stats")
+async def stats(ctx):
+    """Shows runtime counters, latency percentiles and event-loop lag."""
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    from rich.table import Table
+    def millis(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.0f}ms" if seconds < 10 else f"{seconds:.1f}s"
+
+    table = Table(title="Runtime metrics", show_header=True, header_style="bold cyan")
+    table.add_column("Metric", style="magenta")
+    table.add_column("Labels", style="dim")
+    table.add_column("Value", style="green")
+    for (name, labels), value in sorted(metrics.snapshot_counters().items()):
+        table.add_row(name, ", ".join(f"{k}={v}" for k, v in labels), str(value))
+    for name, value in metrics.gauges().items():
+        table.add_row(name, "", f"{value:.3f}" if isinstance(value, float) else str(value))
+    for (name, labels), histogram in sorted(metrics.histograms.items()):
+        quantiles = " / ".join(millis(histogram.quantile(q)) for q in (0.5, 0.95, 0.99))
+        table.add_row(name, ", ".join(f"{k}={v}" for k, v in labels), f"{quantiles} (n={histogram.count})")
+    console.print(table)
+    console.print("[dim]Histograms show p50 / p95 / p99.[/dim]" + (f" [dim]Prometheus: http://127.0.0.1:{METRICS_PORT}/metrics[/dim]" if METRICS_PORT else ""))
+
+def submit_expression_purge(ctx, expression, limit, priority="normal"):
+    """Queues a `.purge` run as a job. Raises ValueError for an invalid expression."""
+    compile_expression(expression)
+
+    async def run():
+        console.print(f"[bold cyan]--- STARTED PURGE: {escape(expression)} ({limit or 'ALL'}) ---[/bold cyan]")
+        s_count, d_count = await purge_expression(ctx, expression, limit=limit)
+        msg = f"✅ Deleted {d_count} messages matching the filter (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
+
+    return submit_channel_job(ctx.channel, f"purge {expression}", run, priority)
+
+@bot.command(name="purge")
+async def purge(ctx, *, expression: str = None):
+    """
+    Delete messages matching a filter expression, in a single history pass.
+    Usage: .purge author:@User AND (has:link OR word:foo) AND before:2024-01-01 AND NOT pinned [limit:N]
+    Terms: author:<@user|id|me> word:<text> re:<regex> has:link has:file before:/after:<YYYY-MM-DD|id>
+    pinned own all; combine with AND, OR, NOT and parentheses. limit:N (default 1000, 0 = all).
+    Add --dry-run to only estimate (same as .estimate).
+    """
+    if not expression:
+        console.print("❌ Usage: `.purge <expression>` e.g. `.purge author:@User AND (has:link OR word:foo) AND NOT pinned limit:0`")
+        return
+    expression, dry_run = strip_dry_run(expression)
+    if dry_run:
+        await estimate(ctx, expression=expression)
+        return
+    try:
+        limit = compile_expression(expression).limit
+    except ValueError as e:
+        console.print(f"[bold red]❌ Invalid filter: {e}[/bold red]")
+        return
+
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    actual_limit = 1000 if limit is None else (limit or None)
+    submit_expression_purge(ctx, expression, actual_limit)
+
+async def estimate_expression(ctx, expression):
+    """Prints a dry-run estimate for `.purge <expression>` in this channel. Raises ValueError for an invalid expression."""
+    limit = compile_expression(expression).limit
+    actual_limit = 1000 if limit is None else (limit or None)
+    permissions = ctx.channel.permissions_for(ctx.author)
+    can_manage = permissions.manage_messages or permissions.administrator
+
+    console.print(f"[bold cyan]🔮 Estimating: {escape(expression)} ({actual_limit or 'ALL'})...[/bold cyan]")
+    estimator = PurgeEstimator(ctx.channel, expression, actual_limit, can_manage)
+    result = await estimator.run()
+
+    how = {
+        "index": "counted from the local index",
+        "read": f"read in full ({result['requests']} page(s))",
+        "sample": f"sampled {len(estimator.strata)} page(s) across the history, {result['requests']} requests",
+    }[result["source"]]
+    margin = f" ± {result['margin']:,}" if result["margin"] else ""
+    bulk = f", ~{result['bulk']:,} of them in bulk-delete calls" if result["bulk"] else ""
+    mode = "" if can_manage else " [dim](personal mode: only your own messages)[/dim]"
+    console.print(f"[bold]🔮 Dry run in #{getattr(ctx.channel, 'name', None) or 'DM'}[/bold] [dim]({how}; nothing deleted)[/dim]{mode}")
+    console.print(f"   📡 Messages in scope: ~{result['scanned']:,} → {result['pages']:,} {result['page_kind']} pages to read")
+    console.print(f"   🗑️ Expected deletes: ~{result['matched']:,}{margin}{bulk}")
+    console.print(
+        f"   ⏱️ Projected time: ~{format_duration(result['seconds'])} under `{result['policy']}` "
+        f"[dim](delete ≈ {result['per_delete']:.2f}s each, {result['pacing']}; page ≈ {result['page_seconds']:.2f}s)[/dim]"
+    )
+
+@bot.command(name="estimate")
+async def estimate(ctx, *, expression: str = None):
+    """
+    Dry run: how many messages a `.purge` would scan and delete here, and how long it would take.
+    Usage: .estimate <expression> [limit:N]  (same syntax and defaults as .purge; nothing is deleted)
+    """
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if not expression:
+        console.print("❌ Usage: `.estimate <expression>` e.g. `.estimate all limit:0` or `.estimate after:2024-01-01 limit:0`")
+        return
+    try:
+        await estimate_expression(ctx, expression)
+    except ValueError as e:
+        console.print(f"[bold red]❌ Invalid filter: {e}[/bold red]")
+
 @bot.command(name="purge_user")
 async def purge_user(ctx, arg1: str = None, arg2: str = None):
     """
@@ -333,21 +3953,15 @@ async def purge_user(ctx, arg1: str = None, arg2: str = None):
     target_name = "EVERYONE" if is_everyone else target_user.name
     actual_limit = limit_input if limit_input > 0 else None
     
-    console.print(f"[bold cyan]--- STARTED PURGE FOR {target_name} ({actual_limit or 'ALL'}) ---[/bold cyan]")
-    
-    def filter_func(m):
-        if is_everyone:
-            return True
-        return m.author.id == target_user.id
+    expr = "all" if is_everyone else f"author:{target_user.id}"
 
-    s_count, d_count = await smart_purge(
-        ctx, 
-        ctx.channel.history(limit=actual_limit), 
-        filter_func=filter_func
-    )
+    async def run():
+        console.print(f"[bold cyan]--- STARTED PURGE FOR {target_name} ({actual_limit or 'ALL'}) ---[/bold cyan]")
+        s_count, d_count = await purge_expression(ctx, expr, limit=actual_limit)
+        msg = f"✅ Deleted {d_count} messages from {target_name} (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
 
-    msg = f"✅ Deleted {d_count} messages from {target_name} (Scanned {s_count})"
-    console.print(f"[bold green]{msg}[/bold green]")
+    submit_channel_job(ctx.channel, f"purge_user {target_name}", run)
 
 @bot.command(name="purge_word")
 async def purge_word(ctx, word: str, limit: int = 1000):
@@ -358,16 +3972,13 @@ async def purge_word(ctx, word: str, limit: int = 1000):
     except:
         pass
 
-    console.print(f"[bold cyan]--- STARTED PURGE FOR WORD: '{word}' ---[/bold cyan]")
-    
-    s_count, d_count = await smart_purge(
-        ctx, 
-        ctx.channel.history(limit=actual_limit), 
-        filter_func=lambda m: word.lower() in m.content.lower()
-    )
+    async def run():
+        console.print(f"[bold cyan]--- STARTED PURGE FOR WORD: '{word}' ---[/bold cyan]")
+        s_count, d_count = await purge_expression(ctx, f"word:{quote_value(word)}", limit=actual_limit)
+        msg = f"✅ Deleted {d_count} messages containing '{word}' (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
 
-    msg = f"✅ Deleted {d_count} messages containing '{word}' (Scanned {s_count})"
-    console.print(f"[bold green]{msg}[/bold green]")
+    submit_channel_job(ctx.channel, f"purge_word {word}", run)
 
 @bot.command(name="purge_media")
 async def purge_media(ctx, limit: int = 1000):
@@ -378,16 +3989,13 @@ async def purge_media(ctx, limit: int = 1000):
     except:
         pass
 
-    console.print(f"[bold cyan]--- STARTED PURGE FOR MEDIA/ATTACHMENTS ---[/bold cyan]")
-    
-    s_count, d_count = await smart_purge(
-        ctx, 
-        ctx.channel.history(limit=actual_limit), 
-        filter_func=lambda m: len(m.attachments) > 0
-    )
+    async def run():
+        console.print(f"[bold cyan]--- STARTED PURGE FOR MEDIA/ATTACHMENTS ---[/bold cyan]")
+        s_count, d_count = await purge_expression(ctx, "has:file", limit=actual_limit)
+        msg = f"✅ Deleted {d_count} messages with media (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
 
-    msg = f"✅ Deleted {d_count} messages with media (Scanned {s_count})"
-    console.print(f"[bold green]{msg}[/bold green]")
+    submit_channel_job(ctx.channel, "purge_media", run)
 
 @bot.command(name="purge_links")
 async def purge_links(ctx, limit: int = 1000):
@@ -398,21 +4006,18 @@ async def purge_links(ctx, limit: int = 1000):
     except:
         pass
 
-    console.print(f"[bold cyan]--- STARTED PURGE FOR LINKS ---[/bold cyan]")
-    
-    s_count, d_count = await smart_purge(
-        ctx, 
-        ctx.channel.history(limit=actual_limit), 
-        filter_func=lambda m: re.search(URL_REGEX, m.content)
-    )
+    async def run():
+        console.print(f"[bold cyan]--- STARTED PURGE FOR LINKS ---[/bold cyan]")
+        s_count, d_count = await purge_expression(ctx, "has:link", limit=actual_limit)
+        msg = f"✅ Deleted {d_count} messages with links (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
 
-    msg = f"✅ Deleted {d_count} messages with links (Scanned {s_count})"
-    console.print(f"[bold green]{msg}[/bold green]")
+    submit_channel_job(ctx.channel, "purge_links", run)
 
 @bot.command(name="purge_since")
-async def purge_since(ctx, date_str: str, limit: int = 1000):
+async def purge_since(ctx, date_str: str, limit: int = 0):
     try:
-        since_date = datetime.strptime(date_str, "%Y-%m-%d")
+        datetime.strptime(date_str, "%Y-%m-%d")
     except ValueError:
         console.print("❌ Invalid format! Use: `.purge_since YYYY-MM-DD`")
         return
@@ -424,71 +4029,307 @@ async def purge_since(ctx, date_str: str, limit: int = 1000):
     except:
         pass
 
-    console.print(f"[bold cyan]--- STARTED PURGE SINCE {date_str} ---[/bold cyan]")
-    
-    s_count, d_count = await smart_purge(
-        ctx, 
-        ctx.channel.history(limit=actual_limit, after=since_date), 
-        filter_func=lambda m: True # All messages after date
-    )
+    async def run():
+        console.print(f"[bold cyan]--- STARTED PURGE SINCE {date_str} ---[/bold cyan]")
+        s_count, d_count = await purge_expression(ctx, f"after:{date_str}", limit=actual_limit) # All messages after date
+        msg = f"✅ Deleted {d_count} messages since {date_str} (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
+
+    submit_channel_job(ctx.channel, f"purge_since {date_str}", run)
+
+@bot.command(name="purge_range")
+async def purge_range(ctx, start: str, end: str, filter_token: str = "all"):
+    """
+    Delete messages between two dates or message ids (end exclusive), walking only that slice.
+    Usage: .purge_range <YYYY-MM-DD|id> <YYYY-MM-DD|id> [own/all/media/links/word=x/user=id]
+    """
+    try:
+        low_id, high_id = parse_bound(start), parse_bound(end)
+        spec = spec_from_token(filter_token)
+    except ValueError as e:
+        console.print(f"❌ {e}. Use: `.purge_range <YYYY-MM-DD|id> <YYYY-MM-DD|id> [filter]`")
+        return
+    if low_id > high_id:
+        low_id, high_id = high_id, low_id
+
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    async def run():
+        console.print(f"[bold cyan]--- STARTED RANGE PURGE {start} → {end} ({describe_spec(spec)}) ---[/bold cyan]")
+        checkpoint = checkpoints.start(ctx.channel.id, spec, after_id=low_id - 1)
+        checkpoint.cursor_id = high_id
+        s_count, d_count = await smart_purge(
+            ctx, 
+            range_history(ctx.channel, low_id, high_id), 
+            filter_func=build_filter(spec),
+            checkpoint=checkpoint
+        )
+        msg = f"✅ Deleted {d_count} messages between {start} and {end} (Scanned {s_count})"
+        console.print(f"[bold green]{msg}[/bold green]")
 
-    msg = f"✅ Deleted {d_count} messages since {date_str} (Scanned {s_count})"
-    console.print(f"[bold green]{msg}[/bold green]")
+    submit_channel_job(ctx.channel, f"purge_range {start} {end} {describe_spec(spec)}", run)
+
+@bot.command(name="resume")
+async def resume(ctx, target: str = None):
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if target == "list":
+        saved = list(checkpoints.checkpoints.values())
+        if not saved:
+            console.print("📋 No saved purge checkpoints.")
+            return
+        for cp in saved:
+            console.print(f"[cyan]📌 {cp.channel_id}[/cyan] [dim]|[/dim] {cp.spec} [dim]|[/dim] scanned {cp.scanned}, deleted {cp.deleted}")
+        return
+
+    channel = ctx.channel
+    if target:
+        channel = bot.get_channel(int(target)) if target.isdigit() else None
+        if channel is None:
+            console.print(f"[bold red]❌ Unknown channel: {target}[/bold red]")
+            return
+
+    checkpoint = checkpoints.get(channel.id)
+    if checkpoint is None:
+        console.print("[bold yellow]⚠️ No saved purge to resume for this channel.[/bold yellow]")
+        return
+
+    remaining = None
+    if checkpoint.limit is not None:
+        remaining = checkpoint.limit - checkpoint.scanned
+        if remaining <= 0:
+            checkpoints.discard(channel.id)
+            console.print("[bold yellow]⚠️ That purge had already reached its limit.[/bold yellow]")
+            return
+
+    before = discord.Object(id=checkpoint.cursor_id) if checkpoint.cursor_id else None
+    after = discord.Object(id=checkpoint.after_id) if checkpoint.after_id else None
+
+    async def run():
+        console.print(f"[bold cyan]--- RESUMING PURGE {checkpoint.spec} (already scanned {checkpoint.scanned}) ---[/bold cyan]")
+        s_count, d_count = await smart_purge(
+            ctx, 
+            search_history(channel, checkpoint.spec, limit=remaining, before=before, checkpoint=checkpoint) if after is None
+            else channel.history(limit=remaining, before=before, after=after, oldest_first=False), 
+            filter_func=build_filter(checkpoint.spec),
+            checkpoint=checkpoint
+        )
+        msg = f"✅ Resumed purge deleted {d_count} more messages (Scanned {s_count}, total {checkpoint.deleted})"
+        console.print(f"[bold green]{msg}[/bold green]")
+
+    submit_channel_job(channel, f"resume {describe_spec(checkpoint.spec)}", run)
 
 @bot.command(name="whitelist")
-async def whitelist(ctx, action: str = "list", message_id: int = None):
-    global whitelist_ids
-    
+async def whitelist(ctx, action: str = "list", *args: str):
+    """
+    Messages that are never deleted by purges or watch mode. Persisted to purger_protection.json.
+    Usage: .whitelist add|remove <id> | add-range|remove-range <from> <to> | add-author|remove-author <@user|id>
+           .whitelist pinned on|off | import <file> | export [file] | list | clear
+    """
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    action = action.lower()
+    try:
+        if action in ("add", "remove") and args:
+            message_id = int(args[0])
+            if action == "add":
+                await protection.add_ids([message_id])
+                msg = f"🛡️ Added message `{message_id}` to whitelist."
+            else:
+                await protection.remove_id(message_id)
+                msg = f"🔓 Removed message `{message_id}` from whitelist."
+        elif action in ("add-range", "remove-range") and len(args) == 2:
+            low, high = sorted((parse_bound(args[0]), parse_bound(args[1])))
+            if action == "add-range":
+                await protection.add_range(low, high)
+                msg = f"🛡️ Protected every message from {args[0]} to {args[1]}."
+            else:
+                await protection.remove_range(low, high)
+                msg = f"🔓 Unprotected messages from {args[0]} to {args[1]}."
+        elif action in ("add-author", "remove-author") and args:
+            match = _MENTION.fullmatch(args[0])
+            if not match:
+                raise ValueError(f"needs a mention or a user id, got {args[0]}")
+            author_id = int(match.group(1) or match.group(2))
+            if action == "add-author":
+                await protection.add_author(author_id)
+                msg = f"🛡️ Protected every message by <@{author_id}>."
+            else:
+                await protection.remove_author(author_id)
+                msg = f"🔓 Messages by <@{author_id}> are no longer protected."
+        elif action == "pinned" and args and args[0].lower() in ("on", "off"):
+            enabled = args[0].lower() == "on"
+            await protection.set_pinned(enabled)
+            msg = "📌 Pinned messages are now protected." if enabled else "📌 Pinned messages are no longer protected."
+        elif action == "import" and args:
+            before = protection.id_count()
+            await protection.import_data(await asyncio.to_thread(read_protection_file, args[0]))
+            msg = f"📥 Imported {args[0]}: {protection.id_count() - before} new ids ({protection.summary()})."
+        elif action == "export":
+            path = args[0] if args else f"protection-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+            await asyncio.to_thread(write_protection_file, path, protection.export())
+            msg = f"📤 Exported whitelist to {path} ({protection.summary()})."
+        elif action == "clear":
+            await protection.clear()
+            msg = "🧹 Whitelist cleared."
+        elif action == "list":
+            await asyncio.to_thread(protection.load)
+            ids = sorted(protection.all_ids())
+            shown = ", ".join(map(str, ids[:20])) + (f" … (+{len(ids) - 20})" if len(ids) > 20 else "")
+            msg = f"📋 Current Whitelist: {protection.summary()}"
+            if shown:
+                msg += f"\n   ids: {shown}"
+            if protection.view.authors:
+                msg += f"\n   authors: {', '.join(map(str, sorted(protection.view.authors)))}"
+            for low, high in protection.view.ranges[:10]:
+                msg += f"\n   range: {discord.utils.snowflake_time(low):%Y-%m-%d %H:%M} → {discord.utils.snowflake_time(high):%Y-%m-%d %H:%M}"
+        else:
+            msg = "❌ Usage: `.whitelist add|remove <id>` / `add-range <from> <to>` / `add-author <@user>` / `pinned on|off` / `import <file>` / `export [file]` / `list` / `clear`"
+    except (OSError, ValueError) as e:
+        msg = f"❌ Whitelist {action} failed: {e}"
+
+    console.print(msg)
+
+@bot.command(name="index")
+async def index(ctx, action: str = "stats"):
     try:
         await ctx.message.delete()
     except:
         pass
 
-    if action == "add" and message_id:
-        whitelist_ids.add(message_id)
-        msg = f"🛡️ Added message `{message_id}` to whitelist."
-    elif action == "remove" and message_id:
-        whitelist_ids.discard(message_id)
-        msg = f"🔓 Removed message `{message_id}` from whitelist."
-    elif action == "clear":
-        whitelist_ids.clear()
-        msg = "🧹 Whitelist cleared."
+    if action == "clear":
+        message_index.clear(ctx.channel.id)
+        msg = "🧹 Local index cleared for this channel."
+    elif action == "clear_all":
+        message_index.clear()
+        msg = "🧹 Local index cleared for all channels."
     else:
-        msg = f"📋 Current Whitelist: {', '.join(map(str, whitelist_ids)) or 'Empty'}"
+        snapshot = message_index.snapshot(ctx.channel.id)
+        if snapshot:
+            oldest_id, newest_id, complete = snapshot
+            span = f"{discord.utils.snowflake_time(oldest_id):%Y-%m-%d} → {discord.utils.snowflake_time(newest_id):%Y-%m-%d}"
+            msg = f"🗂️ Indexed {message_index.count(ctx.channel.id)} messages ({span}{', full history' if complete else ''})"
+        else:
+            msg = "🗂️ This channel has not been indexed yet."
 
     console.print(msg)
 
 @bot.command(name="speed")
 async def speed(ctx, mode: str = "safe"):
-    global deletion_delay
-    
     try:
         await ctx.message.delete()
     except:
         pass
 
-    modes = {
-        "safe": 2.2,
-        "fast": 1.2,
-        "insane": 0.5
-    }
-
-    if mode in modes:
-        deletion_delay = modes[mode]
+    if mode in SPEED_POLICIES:
+        policy = SPEED_POLICIES[mode]
     else:
         try:
-            deletion_delay = float(mode)
+            delay = float(mode)
         except ValueError:
             console.print("❌ Usage: `.speed <safe/fast/insane/float>`")
             return
+        # A custom delay is a fixed pace: no speed-up below what the user asked for
+        policy = PacingPolicy("custom", base_delay=delay, min_delay=delay, headroom=1, max_rate=1 / delay if delay > 0 else None)
 
-    msg = f"⚡ Speed set to: {mode} ({deletion_delay}s delay)"
+    delete_scheduler.set_policy(policy)
+    msg = f"⚡ Speed set to: {mode} ({policy.base_delay}s start, {policy.min_delay}s floor, {policy.headroom} reserved/bucket)"
     console.print(f"[bold yellow]{msg}[/bold yellow]")
 
+@bot.command(name="log")
+async def log_mode(ctx, mode: str = None):
+    """Sets how deletes are reported: verbose (per message), summary (per channel, coalesced) or quiet."""
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if mode not in ActivityLog.MODES:
+        console.print(f"❌ Usage: `.log <verbose/summary/quiet>` (current: {activity_log.mode})")
+        return
+
+    activity_log.flush()
+    activity_log.mode = mode
+    console.print(f"[bold yellow]📝 Delete log mode: {mode}[/bold yellow]")
+
+@bot.command(name="profile")
+async def profile(ctx, action: str = None, option: str = None):
+    """
+    Profiles the next purge or a watch window.
+    Usage: .profile on [mem] | .profile off | .profile dump
+    """
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if action == "on":
+        if profiler.session is not None:
+            console.print("❌ Profiling is already on. Use `.profile dump` or `.profile off`.")
+            return
+        profiler.start(memory=option == "mem")
+        extra = " + tracemalloc" if option == "mem" else ""
+        console.print(f"[bold magenta]🔬 Profiling on (cProfile + task timing{extra}). It stops when the next purge finishes, or with `.profile off`.[/bold magenta]")
+    elif action in ("off", "dump"):
+        if profiler.session is None:
+            console.print("❌ Profiling is not on. Start it with `.profile on [mem]`.")
+            return
+        path = await profiler.stop("window closed by .profile off") if action == "off" else await profiler.dump()
+        console.print(f"[bold magenta]🔬 Profile written: {path}[/bold magenta]")
+    else:
+        state = "on" if profiler.session is not None else "off"
+        console.print(f"❌ Usage: `.profile on [mem]` / `.profile off` / `.profile dump` (currently {state})")
+
+@bot.command(name="archive")
+async def archive_command(ctx, *options: str):
+    """
+    Saves a copy of every message selected for deletion before it is deleted.
+    Usage: .archive on [files] [gzip|zstd] | .archive off | .archive
+    """
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    action = options[0].lower() if options else "status"
+    flags = {option.lower() for option in options[1:]}
+    if action == "on":
+        if archive.active:
+            console.print(f"❌ Already archiving to {archive.path}. Use `.archive off` first.")
+            return
+        compression = archive.start(files="files" in flags, compression="gzip" if "gzip" in flags else "zstd")
+        note = " (zstandard not installed, using gzip)" if compression == "gzip" and "gzip" not in flags else ""
+        files = f" + attachments in {archive.files_dir}" if archive.files_dir else ""
+        console.print(f"[bold green]🗄️ Archiving messages before deletion to {archive.path}{files}{note}[/bold green]")
+    elif action == "off":
+        if not archive.active:
+            console.print("❌ Archive is not on. Start it with `.archive on [files]`.")
+            return
+        console.print("[dim]🗄️ Finishing downloads and closing the archive...[/dim]")
+        await archive.stop()
+        console.print(f"[bold green]🗄️ Archive closed: {archive.path} ({archive.status()})[/bold green]")
+    elif archive.active:
+        console.print(f"🗄️ Archiving to {archive.path}: {archive.status()}")
+    else:
+        console.print("🗄️ Archive is off. Usage: `.archive on [files] [gzip|zstd]` / `.archive off`")
+
 @bot.command(name="multipurge")
-async def multipurge(ctx, *channels: discord.TextChannel):
-    if not channels:
-        console.print("❌ Usage: `.multipurge #chan1 #chan2 ...`")
+async def multipurge(ctx, *targets: str):
+    """
+    Purge several channels concurrently, including their threads and forum posts.
+    Usage: .multipurge #c1 #c2:5000 #c3:0:media  (<channel>[:limit][:filter], 0 = full history)
+    """
+    if not targets:
+        console.print("❌ Usage: `.multipurge #chan1[:limit][:filter] #chan2 ...` (filters: own, all, media, links, word=x, user=id)")
         return
 
     try:
@@ -496,27 +4337,86 @@ async def multipurge(ctx, *channels: discord.TextChannel):
     except:
         pass
 
-    console.print(f"[bold cyan]--- STARTED MULTI-CHANNEL PURGE ({len(channels)} channels) ---[/bold cyan]")
-    
-    total_deleted = 0
-    for channel in channels:
-        if cancel_purge:
-            break
-            
-        chan_display = channel.name if hasattr(channel, "name") else f"DM ({channel.recipient})"
-        console.print(f"[magenta]🌐 Purging channel: {chan_display}...[/magenta]")
+    converter = commands.GuildChannelConverter()
+    channel_targets = []
+    for token in targets:
+        ref, _, rest = token.partition(":")
+        limit_str, _, filter_str = rest.partition(":")
         try:
-            _, d_count = await smart_purge(
-                ctx, 
-                channel.history(limit=1000), # Default limit for multipurge
-                filter_func=lambda m: m.author.id == bot.user.id
-            )
-            total_deleted += d_count
-        except Exception as e:
-            console.print(f"[red]❌ Error in {channel.name}: {e}[/red]")
+            channel = await converter.convert(ctx, ref)
+        except commands.BadArgument:
+            channel = bot.get_channel(int(ref)) if ref.isdigit() else None
+        if channel is None:
+            console.print(f"[bold red]❌ Channel not found: {ref}[/bold red]")
+            return
+        try:
+            limit = int(limit_str) if limit_str else MULTIPURGE_DEFAULT_LIMIT
+            spec = spec_from_token(filter_str) if filter_str else {"kind": "own"}
+        except ValueError as e:
+            console.print(f"[bold red]❌ Bad target '{token}': {e}[/bold red]")
+            return
+        channel_targets.extend(await MultiChannelPurge.expand(channel, limit if limit > 0 else None, spec))
+
+    async def run():
+        console.print(f"[bold cyan]--- STARTED MULTI-CHANNEL PURGE ({len(channel_targets)} channels/threads) ---[/bold cyan]")
+        total_deleted = await MultiChannelPurge(channel_targets).run()
+        msg = f"✅ MULTI-PURGE FINISHED! Deleted {total_deleted} messages across {len(channel_targets)} channels."
+        console.print(f"[bold green]{msg}[/bold green]")
+        await profiler.purge_finished(f"multipurge of {len(channel_targets)} channels")
+
+    guilds = {target.channel.guild.id for target in channel_targets if getattr(target.channel, "guild", None)}
+    announce_job(jobs.submit(
+        f"multipurge of {len(channel_targets)} channels", run,
+        channels=[target.channel.id for target in channel_targets], guilds=guilds,
+    ))
+
+def submit_guild_purge(guild, spec, priority="normal"):
+    """Queues a planned purge of a whole guild as a job; the planning runs inside the job."""
+    async def run():
+        console.print(f"[bold cyan]🗺️ Planning purge of {guild.name} ({describe_spec(spec)})...[/bold cyan]")
+        planner = GuildPurgePlanner(guild, spec)
+        keep = await planner.plan()
+        console.print(planner.render(keep))
+        console.print(f"[dim]Probed {len(planner.probes)} channels/threads with {planner.requests} search request(s); skipping {len(planner.probes) - len(keep)} with nothing to delete.[/dim]")
+        if not keep:
+            console.print("[bold green]✅ Nothing to delete in this server.[/bold green]")
+            return
+        if job_cancelled():
+            return
+
+        targets = [probe.target for probe in keep]
+        total_deleted = await MultiChannelPurge(targets).run()
+
+        msg = f"✅ GUILD PURGE FINISHED! Deleted {total_deleted} messages across {len(targets)} channels."
+        console.print(f"[bold green]{msg}[/bold green]")
+        await profiler.purge_finished(f"guild purge of {guild.name}")
+
+    job = jobs.submit(f"purge_guild {guild.name} ({describe_spec(spec)})", run, priority, guilds=(guild.id,), whole_guild=True)
+    announce_job(job)
+    return job
+
+@bot.command(name="purge_guild")
+async def purge_guild(ctx, filter_token: str = "own", guild_id: int = None):
+    """
+    Purge a whole server, scanning only the channels that have something to delete.
+    Usage: .purge_guild [filter] [guild_id]  (filters: own, all, media, links, word=x, user=id)
+    """
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    guild = bot.get_guild(guild_id) if guild_id else ctx.guild
+    if guild is None:
+        console.print("❌ Usage: `.purge_guild [filter] [guild_id]` (the guild id is required outside a server)")
+        return
+    try:
+        spec = spec_from_token(filter_token)
+    except ValueError as e:
+        console.print(f"[bold red]❌ {e}[/bold red]")
+        return
 
-    msg = f"✅ MULTI-PURGE FINISHED! Deleted {total_deleted} messages across {len(channels)} channels."
-    console.print(f"[bold green]{msg}[/bold green]")
+    submit_guild_purge(guild, spec)
 
 @bot.command(name="shutdown")
 async def shutdown(ctx):
@@ -525,6 +4425,7 @@ async def shutdown(ctx):
     except:
         pass
 
+    await archive.stop() # Flush and close an open archive before the loop goes away
     msg = "👋 Selfbot is shutting down. Goodbye!"
     console.print(f"\n[bold magenta]{'='*40}[/bold magenta]")
     console.print(f"[bold magenta]   {msg}   [/bold magenta]")
@@ -534,17 +4435,77 @@ async def shutdown(ctx):
 
 @bot.command(name="stop")
 async def stop_purge(ctx):
-    global cancel_purge
-    cancel_purge = True
-    
     try:
         await ctx.message.delete()
     except:
         pass
-        
-    msg = "🛑 Requested purge cancellation..."
+
+    cancelled = jobs.cancel_all()
+    msg = f"🛑 Requested cancellation of {len(cancelled)} job(s)..."
     console.print(f"[bold yellow]{msg}[/bold yellow]")
 
+@bot.command(name="jobs")
+async def jobs_command(ctx, action: str = None, job_id: int = None, priority: str = None):
+    """
+    Lists purge jobs, or changes the priority of one.
+    Usage: .jobs | .jobs priority <id> <high|normal|low>
+    """
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if action == "priority" and job_id is not None and priority:
+        try:
+            job = jobs.set_priority(job_id, priority.lower())
+        except ValueError as e:
+            console.print(f"[bold red]❌ {e}[/bold red]")
+            return
+        console.print(f"🗂️ Job #{job.id} priority set to {priority.lower()} ({job.state()})")
+    elif action is not None:
+        console.print("❌ Usage: `.jobs` / `.jobs priority <id> <high|normal|low>`")
+    elif not jobs.jobs:
+        console.print("🗂️ No purge jobs yet.")
+    else:
+        console.print(jobs.render())
+
+@bot.command(name="cancel")
+async def cancel_job(ctx, job_id: int = None):
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if job_id is None:
+        console.print("❌ Usage: `.cancel <job id>` (see `.jobs`; `.stop` cancels every job)")
+        return
+    try:
+        job = jobs.cancel(job_id)
+    except ValueError as e:
+        console.print(f"[bold red]❌ {e}[/bold red]")
+        return
+    console.print(f"[bold yellow]🛑 Cancelling job #{job.id}: {escape(job.label)}[/bold yellow]")
+
+@bot.command(name="pause")
+async def pause_job(ctx, job_id: int = None):
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+
+    if job_id is None:
+        console.print("❌ Usage: `.pause <job id>` (run it again to continue)")
+        return
+    try:
+        job = jobs.toggle_pause(job_id)
+    except ValueError as e:
+        console.print(f"[bold red]❌ {e}[/bold red]")
+        return
+    if job.paused:
+        console.print(f"[bold yellow]⏸️ Paused job #{job.id}: {escape(job.label)}[/bold yellow]")
+    else:
+        console.print(f"[bold green]▶️ Resumed job #{job.id}: {escape(job.label)}[/bold green]")
+
 @bot.event
 async def on_command_error(ctx, error):
     error_msg = ""
@@ -567,6 +4528,7 @@ async def on_command_error(ctx, error):
         pass
 
 if __name__ == "__main__":
+    install_runtime()
     if TOKEN:
         try:
             bot.run(TOKEN)
@@ -0,0 +1,44 @@
+"""
+Worker side of the content classification stage in purger_bot.py.
+
+Runs inside ProcessPoolExecutor workers, so it must stay importable on its
+own: no discord, no Rich, no bot state. A rule is a plain tuple:
+
+  ("word", text)          case-insensitive substring
+  ("re", pattern, flags)  re.search
+"""
+import re
+from array import array
+from functools import lru_cache
+
+
+@lru_cache(maxsize=64)
+def _compile(rules):
+    checks = []
+    for rule in rules:
+        if rule[0] == "word":
+            checks.append((True, rule[1]))
+        elif rule[0] == "re":
+            checks.append((False, re.compile(rule[1], rule[2]).search))
+        else:
+            raise ValueError(f"Unknown classification rule: {rule[0]}")
+    return checks
+
+
+def classify_page(rules, contents):
+    """Returns one bitmask per content string (bit i set = rule i matched) as a compact array."""
+    checks = _compile(rules)
+    masks = array("Q")
+    for content in contents:
+        lowered = None
+        mask = 0
+        for bit, (is_word, check) in enumerate(checks):
+            if is_word:
+                if lowered is None:
+                    lowered = content.lower()
+                if check in lowered:
+                    mask |= 1 << bit
+            elif check(content) is not None:
+                mask |= 1 << bit
+        masks.append(mask)
+    return masks